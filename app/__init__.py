@@ -3,4 +3,9 @@ from flask import Flask
 app = Flask(__name__)
 app.secret_key = "supersecretkey"  # Change to a strong secret key in production
 
+from app import db, metrics, qr
+db.init_app(app)
+metrics.init_app(app)
+qr.init_app(app)
+
 from app import routes
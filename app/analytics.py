@@ -0,0 +1,211 @@
+# app/analytics.py
+
+import bisect
+import time
+
+import numpy as np
+
+from app.db import get_db
+from app.models import ATTENDANCE_VERSION, VersionChecked, get_version
+
+DEFAULT_LIMIT = 100
+
+
+# ---------------- Attendance Matrix ----------------
+class AttendanceMatrix(VersionChecked):
+    """
+    Students x events attendance as a packed bit-matrix (one bit per
+    "Present" mark, eight events per byte). Rows follow student id order,
+    columns follow event date order.
+
+    A roster change rebuilds the matrix; attendance changes are applied
+    incrementally from rows stamped with a version above the last one
+    seen, served by idx_attendance_version. Deleted attendance rows are
+    only dropped on the next rebuild.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.attendance_version = 0
+        self.student_ids = np.empty(0, dtype=np.int64)
+        self.names = []
+        self.domain_codes = np.empty(0, dtype=np.int32)
+        self.domains = []
+        self.events = []
+        self._event_index = {}
+        self.bits = np.zeros((0, 0), dtype=np.uint8)
+
+    # ---- loading ----
+    def _load_roster(self, conn):
+        rows = conn.execute("SELECT id, name, domain FROM students ORDER BY id").fetchall()
+        self.student_ids = np.fromiter((r["id"] for r in rows), dtype=np.int64, count=len(rows))
+        self.names = [r["name"] for r in rows]
+        domains = [(r["domain"] or "").strip() or "Unspecified" for r in rows]
+        unique, codes = np.unique(np.array(domains, dtype=object), return_inverse=True)
+        self.domains = [str(d) for d in unique]
+        self.domain_codes = codes.astype(np.int32)
+
+    def _set_events(self, events):
+        self.events = events
+        self._event_index = {event: i for i, event in enumerate(events)}
+
+    def _build(self):
+        conn = get_db()
+        # Read the counter first: rows committed later carry a higher version
+        self.attendance_version = get_version(ATTENDANCE_VERSION, conn)
+        self._load_roster(conn)
+        self._set_events([r[0] for r in conn.execute(
+            "SELECT event_date FROM event_attendance_summary WHERE total > 0 ORDER BY event_date"
+        )])
+        self.bits = np.zeros((len(self.student_ids), (len(self.events) + 7) // 8), dtype=np.uint8)
+
+        # Plain tuples: building sqlite3.Row objects dominates a full load
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        for event_date, col in self._event_index.items():
+            ids = np.fromiter((r[0] for r in cursor.execute(
+                "SELECT student_id FROM attendance WHERE event_date = ? AND status = 'Present'", (event_date,)
+            )), dtype=np.int64)
+            self._set_bits(ids, np.full(len(ids), col, dtype=np.int64), np.ones(len(ids), dtype=bool))
+        latest = cursor.execute("SELECT MAX(max_version) FROM event_attendance_summary").fetchone()[0]
+        self.attendance_version = max(self.attendance_version, latest or 0)
+
+    def _refresh(self):
+        """Apply marks written since the last load; False if a rebuild is needed"""
+        rows = get_db().execute(
+            "SELECT student_id, event_date, status, version FROM attendance WHERE version > ? ORDER BY version",
+            (self.attendance_version,)
+        ).fetchall()
+        if not rows:
+            return True
+        new_events = sorted({r[1] for r in rows} - self._event_index.keys())
+        if new_events and self.events and new_events[0] < self.events[-1]:
+            # A back-dated event would shift existing columns
+            return False
+        if new_events:
+            self._set_events(self.events + new_events)
+            width = (len(self.events) + 7) // 8
+            if width > self.bits.shape[1]:
+                grown = np.zeros((self.bits.shape[0], width), dtype=np.uint8)
+                grown[:, :self.bits.shape[1]] = self.bits
+                self.bits = grown
+        self._apply([(r[0], r[1], r[2] == "Present") for r in rows])
+        self.attendance_version = rows[-1][3]
+        return True
+
+    def _apply(self, marks):
+        """Set or clear bits for (student_id, event_date, present) marks, last one wins"""
+        latest = {}
+        for student_id, event_date, present in marks:
+            latest[(student_id, event_date)] = present
+        ids = np.fromiter((k[0] for k in latest), dtype=np.int64, count=len(latest))
+        cols = np.fromiter((self._event_index[k[1]] for k in latest), dtype=np.int64, count=len(latest))
+        self._set_bits(ids, cols, np.fromiter(latest.values(), dtype=bool, count=len(latest)))
+
+    def _set_bits(self, ids, cols, present):
+        """Vectorised bit updates; each (student, event) cell appears at most once"""
+        if not len(self.student_ids):
+            return
+        rows = np.searchsorted(self.student_ids, ids)
+        # Marks for students no longer on the roster have no row
+        known = (rows < len(self.student_ids)) & (self.student_ids[np.minimum(rows, len(self.student_ids) - 1)] == ids)
+        rows, cols, present = rows[known], cols[known], present[known]
+        masks = (1 << (cols & 7)).astype(np.uint8)
+        np.bitwise_or.at(self.bits, (rows[present], cols[present] >> 3), masks[present])
+        np.bitwise_and.at(self.bits, (rows[~present], cols[~present] >> 3), ~masks[~present])
+
+    # ---- queries ----
+    def window(self, start=None, end=None):
+        """(events, bool matrix students x events) for events in [start, end]"""
+        lo = bisect.bisect_left(self.events, start) if start else 0
+        hi = bisect.bisect_right(self.events, end) if end else len(self.events)
+        matrix = np.unpackbits(self.bits, axis=1, count=len(self.events), bitorder="little")[:, lo:hi]
+        return self.events[lo:hi], matrix.astype(bool, copy=False)
+
+
+matrix = AttendanceMatrix()
+
+
+# ---------------- Queries ----------------
+def _snapshot(start, end):
+    matrix.ensure_fresh()
+    with matrix._lock:
+        events, attended = matrix.window(start, end)
+        return events, attended, matrix.student_ids, matrix.names, matrix.domain_codes, matrix.domains
+
+
+def _student(ids, names, i, **fields):
+    return {"student_id": int(ids[i]), "name": names[i], **fields}
+
+
+def eligibility(threshold=0.75, start=None, end=None, limit=DEFAULT_LIMIT) -> dict:
+    """Students who attended at least `threshold` of the events in the window"""
+    started = time.perf_counter()
+    events, attended, ids, names, _, _ = _snapshot(start, end)
+    counts = attended.sum(axis=1)
+    rates = counts / len(events) if events else np.zeros(len(ids))
+    eligible = np.flatnonzero(rates >= threshold) if events else np.empty(0, dtype=np.int64)
+    # Best attendance first, ties in student id order
+    order = eligible[np.argsort(-rates[eligible], kind="stable")][:limit]
+    return {
+        "threshold": threshold,
+        "events": len(events),
+        "students": len(ids),
+        "eligible": int(len(eligible)),
+        "results": [_student(ids, names, i, attended=int(counts[i]), rate=round(float(rates[i]), 4)) for i in order],
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 3),
+    }
+
+
+def streaks(start=None, end=None, limit=DEFAULT_LIMIT) -> dict:
+    """Longest and current run of consecutive attended events per student"""
+    started = time.perf_counter()
+    events, attended, ids, names, _, _ = _snapshot(start, end)
+    current = np.zeros(len(ids), dtype=np.int32)
+    longest = np.zeros(len(ids), dtype=np.int32)
+    # One vector op per event across the whole roster
+    for column in attended.T:
+        current = (current + 1) * column
+        np.maximum(longest, current, out=longest)
+    order = np.argsort(-longest, kind="stable")[:limit]
+    order = order[longest[order] > 0]
+    return {
+        "events": len(events),
+        "students": len(ids),
+        "max_streak": int(longest.max()) if len(ids) else 0,
+        "distribution": {str(k): int(v) for k, v in enumerate(np.bincount(longest)) if v},
+        "results": [_student(ids, names, i, longest=int(longest[i]), current=int(current[i])) for i in order],
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 3),
+    }
+
+
+def domain_participation(start=None, end=None) -> dict:
+    """Per-domain roster size, attendance rate and per-event turnout"""
+    started = time.perf_counter()
+    events, attended, ids, _, codes, domains = _snapshot(start, end)
+    students = np.bincount(codes, minlength=len(domains))
+    attended_counts = np.bincount(codes, weights=attended.sum(axis=1), minlength=len(domains))
+    active = np.bincount(codes, weights=attended.any(axis=1), minlength=len(domains))
+    # domains x events turnout: group rows by domain and sum each group
+    per_event = np.zeros((len(domains), len(events)), dtype=np.int64)
+    if len(ids) and events:
+        order = np.argsort(codes, kind="stable")
+        starts = np.searchsorted(codes[order], np.arange(len(domains)))
+        per_event = np.add.reduceat(attended[order].astype(np.int64), starts, axis=0)
+    results = []
+    for d, name in enumerate(domains):
+        possible = students[d] * len(events)
+        results.append({
+            "domain": name,
+            "students": int(students[d]),
+            "active_students": int(active[d]),
+            "attendance_rate": round(float(attended_counts[d] / possible), 4) if possible else 0.0,
+            "per_event": {event: int(n) for event, n in zip(events, per_event[d])},
+        })
+    results.sort(key=lambda r: r["attendance_rate"], reverse=True)
+    return {
+        "events": len(events),
+        "students": len(ids),
+        "results": results,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 3),
+    }
@@ -0,0 +1,35 @@
+# app/background.py
+
+import os
+import threading
+
+
+# ---------------- Per-Worker Threads ----------------
+class WorkerThread:
+    """
+    A daemon thread owned by the current process. It is started on first
+    use, and again in a forked child (threads do not survive fork), so the
+    gunicorn master never owns one and every worker gets its own.
+    """
+
+    def __init__(self, target, name):
+        self.target = target
+        self.name = name
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        """Whether the thread has been started in this process"""
+        return self._thread is not None and self._pid == os.getpid()
+
+    def ensure_started(self) -> bool:
+        """Start the thread if this process has none; True if it was just started"""
+        with self._lock:
+            if self.running:
+                return False
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self.target, name=self.name, daemon=True)
+            self._thread.start()
+            return True
@@ -0,0 +1,255 @@
+# app/cards.py
+
+import hashlib
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from app.db import get_db
+from app.metrics import observe
+from app.models import get_qr_png
+from app.qr import get_student_qr
+from app.utils import generate_idcard_pdf, generate_idcard_sheet_pdf, generate_qr_code
+from card_sheets import PdfJoiner, render_sheet
+
+# Bump whenever generate_idcard_pdf's layout changes so cached cards are re-rendered
+TEMPLATE_VERSION = "1"
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.environ.get("CARD_CACHE_DIR", os.path.join(BASE_DIR, "..", "instance", "card_cache"))
+CACHE_MAX_BYTES = int(os.environ.get("CARD_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+RESCAN_EVERY = 64
+
+CARD_FIELDS = ("name", "ieee_id", "domain", "joining_date", "category")
+
+EXPORT_WORKERS = int(os.environ.get("EXPORT_WORKERS", os.cpu_count() or 1))
+# Workers are multithreaded, and a forked child could inherit a lock held by
+# another thread (the metrics registry, the DB layer) and hang; spawn instead
+POOL_CONTEXT = multiprocessing.get_context("spawn")
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_size = {"bytes": None, "writes": 0}
+
+
+# ---------------- QR Bytes ----------------
+def load_qr_bytes(name, ieee_id, digest) -> bytes:
+    """PNG bytes for a student's QR code from the QR store"""
+    png = get_qr_png(digest) if digest else None
+    return png if png is not None else generate_qr_code(name, ieee_id)
+
+
+# ---------------- PDF Cache ----------------
+def card_cache_key(student, digest: str) -> str:
+    """Content address of a rendered card: its fields, QR image and template"""
+    h = hashlib.sha256()
+    for field in CARD_FIELDS:
+        h.update(str(student[field]).encode("utf-8"))
+        h.update(b"\x1f")
+    # The QR store's hash is already the QR image's content hash
+    h.update(digest.encode("ascii"))
+    h.update(TEMPLATE_VERSION.encode("ascii"))
+    return h.hexdigest()
+
+
+def _scan():
+    entries = []
+    for entry in os.scandir(CACHE_DIR):
+        if entry.name.endswith(".pdf"):
+            try:
+                st = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, entry.path))
+    return entries
+
+
+def _evict(keep: str) -> int:
+    """Delete least recently used cards until the cache fits its size bound"""
+    entries = sorted(_scan())
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in entries:
+        if total <= CACHE_MAX_BYTES:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+    return total
+
+
+def _track_write(path: str, size: int):
+    """
+    Keep a per-worker estimate of the cache size, re-scanning now and then
+    to account for cards written by other workers. `size` is taken before
+    the file is published, since another worker may evict it right after.
+    """
+    with _lock:
+        _size["writes"] += 1
+        if _size["bytes"] is None or _size["writes"] % RESCAN_EVERY == 0:
+            _size["bytes"] = sum(size for _, size, _ in _scan())
+        else:
+            _size["bytes"] += size
+        if _size["bytes"] > CACHE_MAX_BYTES:
+            _size["bytes"] = _evict(keep=path)
+
+
+def get_card_pdf(student):
+    """
+    Return (cache_key, path) of the student's rendered ID card, rendering it
+    on a miss. Hits refresh the file's mtime, which is the LRU clock.
+    A roster edit changes the key, so stale cards are never served and
+    simply age out of the cache.
+    """
+    digest, qr_bytes = get_student_qr(student)
+    key = card_cache_key(student, digest)
+    path = os.path.join(CACHE_DIR, f"{key}.pdf")
+
+    if os.path.exists(path):
+        try:
+            os.utime(path)
+            return key, path
+        except FileNotFoundError:
+            pass  # evicted by another worker in between; render again
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    generate_idcard_pdf(student["name"], student["ieee_id"], qr_bytes=qr_bytes, output_path=tmp_path)
+    size = os.path.getsize(tmp_path)
+    os.replace(tmp_path, path)
+
+    _track_write(path, size)
+    return key, path
+
+
+# ---------------- Bulk Export ----------------
+def iter_export_students(domain=None, category=None):
+    """Stream students matching the filters from the database in id order"""
+    sql = "SELECT name, ieee_id, domain, qr_hash FROM students WHERE 1=1"
+    params = []
+    if domain:
+        sql += " AND domain LIKE ?"
+        params.append(f"%{domain}%")
+    if category:
+        sql += " AND category = ?"
+        params.append(category)
+    for row in get_db().execute(sql + " ORDER BY id", params):
+        yield {"name": row["name"], "ieee_id": row["ieee_id"], "domain": row["domain"], "qr_hash": row["qr_hash"]}
+
+
+def _sheet_cards(students):
+    for s in students:
+        yield {
+            "name": s["name"],
+            "ieee_id": s["ieee_id"],
+            "domain": s["domain"],
+            "qr_bytes": load_qr_bytes(s["name"], s["ieee_id"], s["qr_hash"]),
+        }
+
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _render_sheets_parallel(students, per_page, workers):
+    """
+    Render one N-up page per chunk of students across a process pool,
+    yielding PDFs in order. Only a few pages are in flight at once, so
+    memory stays bounded however large the roster is.
+    """
+    if workers <= 1:
+        for chunk in _chunks(students, per_page):
+            yield generate_idcard_sheet_pdf(_sheet_cards(chunk), per_page=per_page)[0]
+        return
+
+    def result(future):
+        pdf_bytes, seconds = future.result()
+        observe("render_duration_seconds", seconds, kind="idcard_sheet_pdf")
+        return pdf_bytes
+
+    # QR bytes are read here, so the children never touch the database; the
+    # task lives in card_sheets, so they never import the app package either
+    jobs = ((list(_sheet_cards(chunk)), per_page) for chunk in _chunks(students, per_page))
+    with ProcessPoolExecutor(max_workers=workers, mp_context=POOL_CONTEXT) as pool:
+        in_flight = deque()
+        for job in jobs:
+            in_flight.append(pool.submit(render_sheet, job))
+            if len(in_flight) >= workers * 2:
+                yield result(in_flight.popleft())
+        while in_flight:
+            yield result(in_flight.popleft())
+
+
+class _StreamBuffer:
+    """Write-only file object that hands written bytes to a generator"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def export_cards_zip(students, per_page=8, workers=None):
+    """
+    Yield a ZIP archive of N-up card sheets (one PDF per page) as it is
+    built, so the response can be streamed without buffering the export.
+    """
+    workers = workers or EXPORT_WORKERS
+    started = time.perf_counter()
+    buf = _StreamBuffer()
+    pages = 0
+    with zipfile.ZipFile(buf, "w", compression=zipfile.ZIP_STORED) as zf:
+        for pages, pdf_bytes in enumerate(_render_sheets_parallel(students, per_page, workers), start=1):
+            zf.writestr(f"idcards_page_{pages:05d}.pdf", pdf_bytes)
+            yield buf.drain()
+    yield buf.drain()
+    _log_export_rate("zip", pages, started)
+
+
+def export_cards_pdf(students, per_page=8, workers=None):
+    """
+    Yield one multi-page N-up PDF as it is built. Pages are rendered across
+    the process pool like the ZIP export and joined into a single document
+    as they arrive, so only the page list is held until the end.
+    """
+    workers = workers or EXPORT_WORKERS
+    started = time.perf_counter()
+    joiner = PdfJoiner()
+    pages = 0
+    yield joiner.start()
+    for pages, pdf_bytes in enumerate(_render_sheets_parallel(students, per_page, workers), start=1):
+        yield joiner.add(pdf_bytes)
+    yield joiner.finish()
+    _log_export_rate("pdf", pages, started)
+
+
+def _log_export_rate(fmt, pages, started):
+    elapsed = time.perf_counter() - started
+    logger.info("Exported %d ID card pages as %s in %.2fs (%.1f pages/sec)",
+                pages, fmt, elapsed, pages / elapsed if elapsed > 0 else 0.0)
@@ -0,0 +1,160 @@
+# app/checkin.py
+
+import hashlib
+import hmac
+import logging
+import os
+import re
+import secrets
+
+from app.db import get_db, transaction
+from app.models import VersionChecked, add_secret, get_secret, prune_qr_codes, set_secret
+
+# Compact signed payload: IEEE1:<ieee_id>:<signature>. Upper-case hex keeps
+# the whole string in the QR alphanumeric mode, so the codes stay small.
+QR_PAYLOAD_PREFIX = "IEEE1"
+SIGNATURE_CHARS = 16
+# Separate key so rotating the session secret does not void printed cards.
+# Without QR_SIGNING_KEY a random key is generated once and stored in the
+# database, so every worker and host serving that database agrees on it.
+QR_SIGNING_KEY = os.environ.get("QR_SIGNING_KEY")
+QR_SIGNING_KEY_SECRET = "qr_signing_key"
+# Fingerprint of the key the stored QR images were signed with
+QR_KEY_FINGERPRINT_SECRET = "qr_signing_key_fingerprint"
+# Where keys were generated before they moved into the database; adopted
+# once so cards printed in between keep verifying
+LEGACY_KEY_FILE = os.environ.get("QR_SIGNING_KEY_FILE", os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "instance", "qr_signing.key"
+))
+# Cards printed before signed payloads carry an unsigned "Name: ..., IEEE ID: ...";
+# they keep checking in until QR_ACCEPT_LEGACY=0 once every card is reprinted
+ACCEPT_LEGACY_QR = os.environ.get("QR_ACCEPT_LEGACY", "1") == "1"
+LEGACY_QR_PATTERN = re.compile(r"^\s*Name:\s*(?P<name>.*),\s*IEEE ID:\s*(?P<ieee_id>\S+)\s*$", re.DOTALL)
+
+
+logger = logging.getLogger(__name__)
+
+_generated_key = {}
+
+
+class InvalidPayload(ValueError):
+    """A scanned string that is neither a valid signed payload nor a legacy code"""
+
+
+# ---------------- QR Payload ----------------
+def _new_signing_key() -> str:
+    try:
+        with open(LEGACY_KEY_FILE) as f:
+            key = f.read().strip()
+        if key:
+            return key
+    except FileNotFoundError:
+        pass
+    logger.warning(
+        "QR_SIGNING_KEY is not set: generated a QR signing key and stored it in the database. "
+        "Printed QR codes only verify against this key."
+    )
+    return secrets.token_hex(32)
+
+
+def _signing_key() -> bytes:
+    # Never the Flask secret key: it ships hard-coded in app/__init__.py
+    if QR_SIGNING_KEY:
+        return QR_SIGNING_KEY.encode("utf-8")
+    if "key" not in _generated_key:
+        key = get_secret(QR_SIGNING_KEY_SECRET)
+        if key is None:
+            with transaction() as conn:
+                key = add_secret(conn, QR_SIGNING_KEY_SECRET, _new_signing_key())
+        _generated_key["key"] = key.encode("utf-8")
+    return _generated_key["key"]
+
+
+def sync_signing_key():
+    """
+    Make sure a signing key exists and, if it is not the key the stored QR
+    images were signed with, drop them so they are re-rendered on next use.
+    Run by init_db, so a changed QR_SIGNING_KEY takes effect on restart.
+    """
+    fingerprint = hashlib.sha256(_signing_key()).hexdigest()[:16]
+    with transaction() as conn:
+        if get_secret(QR_KEY_FINGERPRINT_SECRET, conn) == fingerprint:
+            return
+        dropped = conn.execute("UPDATE students SET qr_hash = NULL WHERE qr_hash IS NOT NULL").rowcount
+        prune_qr_codes(conn)
+        set_secret(conn, QR_KEY_FINGERPRINT_SECRET, fingerprint)
+    if dropped:
+        logger.warning("QR signing key changed: %d stored QR codes will be re-rendered", dropped)
+
+
+def _signature(ieee_id: str) -> str:
+    message = f"{QR_PAYLOAD_PREFIX}:{ieee_id}".encode("utf-8")
+    return hmac.new(_signing_key(), message, hashlib.sha256).hexdigest()[:SIGNATURE_CHARS].upper()
+
+
+def encode_qr_payload(ieee_id) -> str:
+    """The text a student's QR code carries"""
+    ieee_id = str(ieee_id).strip()
+    return f"{QR_PAYLOAD_PREFIX}:{ieee_id}:{_signature(ieee_id)}"
+
+
+def parse_qr_payload(payload: str) -> str:
+    """
+    Return the IEEE ID a scanned QR code stands for. Signed payloads are
+    verified; unsigned legacy codes are accepted unless QR_ACCEPT_LEGACY=0.
+    Raises InvalidPayload otherwise.
+    """
+    payload = (payload or "").strip()
+    prefix, _, rest = payload.partition(":")
+    if prefix.upper() == QR_PAYLOAD_PREFIX:
+        ieee_id, _, signature = rest.rpartition(":")
+        if not ieee_id or not hmac.compare_digest(signature.upper(), _signature(ieee_id)):
+            raise InvalidPayload("QR code signature does not match")
+        return ieee_id
+
+    match = LEGACY_QR_PATTERN.match(payload) if ACCEPT_LEGACY_QR else None
+    if match is None:
+        raise InvalidPayload("Unrecognised QR code")
+    return match.group("ieee_id")
+
+
+# ---------------- Check-in Index ----------------
+class CheckinIndex(VersionChecked):
+    """
+    In-memory ieee_id -> (student_id, name) map and set of student ids, so
+    resolving a scan or validating a self-mark is a dict lookup. Rebuilt
+    when the roster version moves; a student added since the last check
+    falls back to one indexed query.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._students = {}
+        self._ids = set()
+
+    def _build(self):
+        cursor = get_db().cursor()
+        cursor.row_factory = None
+        rows = cursor.execute("SELECT id, ieee_id, name FROM students").fetchall()
+        self._students = {str(ieee_id): (student_id, name) for student_id, ieee_id, name in rows if ieee_id is not None}
+        self._ids = {student_id for student_id, _, _ in rows}
+
+    def resolve(self, ieee_id):
+        """(student_id, name) for an IEEE ID, or None if no such student"""
+        self.ensure_fresh()
+        ieee_id = str(ieee_id)
+        student = self._students.get(ieee_id)
+        if student is None:
+            row = get_db().execute("SELECT id, name FROM students WHERE ieee_id = ?", (ieee_id,)).fetchone()
+            student = (row[0], row[1]) if row else None
+        return student
+
+    def has_student(self, student_id) -> bool:
+        """Whether a student id exists (a dict lookup once the index is warm)"""
+        self.ensure_fresh()
+        if student_id in self._ids:
+            return True
+        return get_db().execute("SELECT 1 FROM students WHERE id = ?", (student_id,)).fetchone() is not None
+
+
+checkin_index = CheckinIndex()
@@ -0,0 +1,141 @@
+# app/db.py
+
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from app import metrics
+
+DB_PATH = os.environ.get(
+    "STUDENTS_DB",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "instance", "students.db")
+)
+
+# ---------------- Connection Tuning ----------------
+BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", 5000))
+MMAP_SIZE = int(os.environ.get("SQLITE_MMAP_SIZE", 64 * 1024 * 1024))
+CACHE_SIZE_KB = int(os.environ.get("SQLITE_CACHE_SIZE_KB", 16 * 1024))
+
+_local = threading.local()
+
+# Callables run after every successful transaction() commit in this process
+_commit_listeners = []
+
+
+# ---------------- Query Timing ----------------
+class TimedCursor(sqlite3.Cursor):
+    """Cursor that reports each statement's execution time to app.metrics"""
+
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._record(sql, parameters, time.perf_counter() - started)
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._record(sql, None, time.perf_counter() - started)
+
+    def _record(self, sql, parameters, seconds):
+        metrics.record_sql(sql, seconds)
+        if metrics.SLOW_QUERY_MS and seconds * 1000 >= metrics.SLOW_QUERY_MS:
+            metrics.log_slow_query(self.connection, sql, parameters, seconds)
+
+
+class TimedConnection(sqlite3.Connection):
+    """Connection whose cursors (including execute() shortcuts) are timed"""
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def connect() -> sqlite3.Connection:
+    """Open a new connection with the pragmas every connection should use"""
+    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+    conn = sqlite3.connect(DB_PATH, timeout=BUSY_TIMEOUT_MS / 1000, factory=TimedConnection)
+    conn.row_factory = sqlite3.Row
+
+    # WAL lets readers keep going while one writer commits; NORMAL is
+    # durable across application crashes and only skips the per-commit fsync
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+    conn.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KB}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    return conn
+
+
+def get_db() -> sqlite3.Connection:
+    """
+    Return this thread's shared connection, opening it on first use.
+    Connections are never carried across a fork, so each gunicorn worker
+    opens its own.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.pid != os.getpid():
+        conn = connect()
+        _local.conn = conn
+        _local.pid = os.getpid()
+    return conn
+
+
+def close_db():
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.pid == os.getpid():
+        conn.close()
+    _local.conn = None
+
+
+@contextmanager
+def transaction():
+    """
+    Run a block as one write transaction on the shared connection.
+    BEGIN IMMEDIATE takes the write lock up front so the busy timeout
+    applies, instead of failing on a read-to-write lock upgrade.
+    """
+    conn = get_db()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    for listener in _commit_listeners:
+        listener()
+
+
+def on_commit(listener):
+    """Register a callable to run after each committed transaction()"""
+    _commit_listeners.append(listener)
+    return listener
+
+
+def init_app(app):
+    @app.cli.command("init-db")
+    def init_db_command():
+        """Create or migrate the database schema."""
+        from app.models import init_db
+        init_db()
+        print(f"Initialized database at {DB_PATH}")
+
+    @app.teardown_appcontext
+    def _rollback_unfinished(exc):
+        # The connection outlives the request; never leak an open
+        # transaction (and its lock) into the next one
+        conn = getattr(_local, "conn", None)
+        if conn is not None and _local.pid == os.getpid() and conn.in_transaction:
+            conn.rollback()
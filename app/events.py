@@ -0,0 +1,139 @@
+# app/events.py
+
+import json
+import logging
+import os
+import threading
+import time
+
+from app.background import WorkerThread
+from app.db import connect, on_commit
+
+# How often each worker re-reads the change counters; this is what makes
+# writes committed by other gunicorn workers show up in local streams.
+POLL_INTERVAL = float(os.environ.get("SSE_POLL_INTERVAL", 1.0))
+# Longest wait between retries while the database keeps failing
+MAX_RETRY_INTERVAL = 30.0
+HEARTBEAT_INTERVAL = 15.0
+# Streams end after this long and EventSource reconnects, so a worker
+# thread is never pinned forever by one tab
+MAX_STREAM_SECONDS = 300.0
+# Each open stream holds a gthread thread; past this many per worker a new
+# stream is told to fall back to polling, so page requests always have
+# threads left. Defaults to a quarter of the worker's threads.
+MAX_STREAMS = int(os.environ.get("SSE_MAX_STREAMS", max(int(os.environ.get("GUNICORN_THREADS", 16)) // 4, 1)))
+
+_stream_slots = threading.BoundedSemaphore(MAX_STREAMS)
+
+logger = logging.getLogger(__name__)
+
+
+# ---------------- Change Watcher ----------------
+class ChangeWatcher:
+    """
+    One background thread per worker that snapshots the app_meta change
+    counters (and watched directories' mtimes) and wakes every subscriber
+    when anything moved. Subscribers never query the database while idle.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._snapshot = {}
+        self._generation = 0
+        self._dirs = {}
+        self._thread = WorkerThread(self._run, "sse-change-watcher")
+        self._wake = threading.Event()
+
+    def watch_dir(self, key, path):
+        self._dirs[key] = path
+
+    def _read_snapshot(self, conn):
+        snapshot = {key: value for key, value in conn.execute("SELECT key, value FROM app_meta")}
+        for key, path in self._dirs.items():
+            snapshot[key] = os.stat(path).st_mtime_ns if os.path.exists(path) else 0
+        return snapshot
+
+    def _run(self):
+        conn, failures = None, 0
+        while True:
+            sleep_for = POLL_INTERVAL
+            try:
+                if conn is None:
+                    conn = connect()
+                snapshot = self._read_snapshot(conn)
+                failures = 0
+                with self._cond:
+                    if snapshot != self._snapshot:
+                        self._snapshot = snapshot
+                        self._generation += 1
+                        self._cond.notify_all()
+            except Exception:
+                # e.g. "database is locked" past the busy timeout: keep the
+                # thread alive, reconnect and back off until reads succeed
+                logger.exception("Change watcher poll failed")
+                if conn is not None:
+                    conn.close()
+                    conn = None
+                failures += 1
+                sleep_for = min(POLL_INTERVAL * 2 ** failures, MAX_RETRY_INTERVAL)
+            self._wake.wait(sleep_for)
+            self._wake.clear()
+
+    def poke(self):
+        """Re-read counters now instead of at the next poll tick"""
+        self._wake.set()
+
+    def wait(self, generation, timeout):
+        """Block until the snapshot generation moves past `generation`"""
+        self._thread.ensure_started()
+        with self._cond:
+            self._cond.wait_for(lambda: self._generation != generation, timeout=timeout)
+            return self._generation, dict(self._snapshot)
+
+    def current(self):
+        self._thread.ensure_started()
+        with self._cond:
+            return self._generation, dict(self._snapshot)
+
+
+watcher = ChangeWatcher()
+on_commit(watcher.poke)
+
+
+# ---------------- SSE Streams ----------------
+def format_event(event, data, event_id=None) -> str:
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'))}")
+    return "\n".join(lines) + "\n\n"
+
+
+def event_stream(on_change):
+    """
+    Generic SSE loop. `on_change(snapshot)` is called with the current
+    counters whenever they change and yields already-formatted events.
+    When the worker already serves MAX_STREAMS streams, a single "busy"
+    event is sent instead and the client is expected to poll.
+    """
+    # Taken inside the generator, so the slot is released by close() even
+    # when the client disconnects mid-stream
+    if not _stream_slots.acquire(blocking=False):
+        yield format_event("busy", {"max_streams": MAX_STREAMS})
+        return
+    try:
+        deadline = time.monotonic() + MAX_STREAM_SECONDS
+        yield "retry: 3000\n\n"
+
+        generation, snapshot = watcher.current()
+        yield from on_change(snapshot)
+        while time.monotonic() < deadline:
+            new_generation, snapshot = watcher.wait(generation, timeout=HEARTBEAT_INTERVAL)
+            if new_generation == generation:
+                yield ": keepalive\n\n"
+                continue
+            generation = new_generation
+            yield from on_change(snapshot)
+    finally:
+        _stream_slots.release()
@@ -0,0 +1,116 @@
+# app/importer.py
+
+import csv
+import logging
+import time
+
+from app.models import clear_and_insert_students, load_student_hashes, row_hash, upsert_students
+
+# Rows between progress callbacks while parsing
+PROGRESS_EVERY = 1000
+
+logger = logging.getLogger(__name__)
+
+
+# ---------------- Roster Import ----------------
+def read_roster_csv(path):
+    """
+    Stream a roster CSV as dicts keyed by normalised column names
+    ("IEEE ID" -> "ieee_id"). Empty cells are empty strings.
+    """
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.reader(f)
+        header = ["_".join(column.lower().split()) for column in next(reader, [])]
+        for values in reader:
+            if any(values):
+                yield dict(zip(header, values))
+
+
+def _student_from_row(row) -> dict:
+    return {
+        "Name": row["name"],
+        "Domain": row.get("domain", ""),
+        "Joining Date": row.get("joining_date", ""),
+        "Category": row.get("category", ""),
+        "IEEE ID": row["ieee_id"],
+    }
+
+
+def _replace_roster(students) -> dict:
+    clear_and_insert_students(students)
+    return {"inserted": len(students), "updated": 0, "unchanged": 0}
+
+
+def _upsert_roster(students) -> dict:
+    existing = load_student_hashes()
+
+    inserts, updates, unchanged = [], [], 0
+    for student in students:
+        student["Hash"] = row_hash(student)
+        current = existing.get(str(student["IEEE ID"]))
+        if current is None:
+            inserts.append(student)
+            continue
+
+        student_id, stored_hash = current
+        if stored_hash == student["Hash"]:
+            unchanged += 1
+            continue
+
+        # The QR code only encodes the (signed) IEEE ID, which is the diff
+        # key here, so updated rows keep their stored QR code
+        student["id"] = student_id
+        updates.append(student)
+
+    upsert_students(inserts, updates)
+    return {"inserted": len(inserts), "updated": len(updates), "unchanged": unchanged}
+
+
+def import_roster(rows, mode: str = "upsert", progress=None) -> dict:
+    """
+    Import roster rows: dicts keyed by lower-cased column names, as
+    yielded by read_roster_csv.
+    "upsert" diffs rows against the stored roster by IEEE ID and only writes
+    new or changed rows; "replace" rewrites the whole students table.
+    Rows repeating an IEEE ID collapse into the last one ("duplicates").
+    QR codes are not rendered here; app.qr renders them on first use.
+    `progress`, if given, is called with rows_parsed / rows_committed
+    counts as the import advances. Returns counts and timing stats.
+    """
+    started = time.perf_counter()
+
+    # Keyed by IEEE ID: a repeated ID keeps its first position, last row wins
+    students, parsed = {}, 0
+    for row in rows:
+        student = _student_from_row(row)
+        students[str(student["IEEE ID"]).strip()] = student
+        parsed += 1
+        if progress and parsed % PROGRESS_EVERY == 0:
+            progress(rows_parsed=parsed)
+    if progress:
+        progress(force=True, rows_parsed=parsed)
+    duplicates = parsed - len(students)
+    if duplicates:
+        logger.warning("Roster repeats %d IEEE IDs; the last row for each was kept", duplicates)
+    students = list(students.values())
+
+    if mode == "replace":
+        result = _replace_roster(students)
+    else:
+        result = _upsert_roster(students)
+    if progress:
+        # The roster is written in one transaction, so rows land all at once
+        progress(force=True, rows_committed=result["inserted"] + result["updated"])
+
+    elapsed = time.perf_counter() - started
+    result.update({
+        "rows": len(students),
+        "duplicates": duplicates,
+        "seconds": elapsed,
+        "rows_per_sec": len(students) / elapsed if elapsed > 0 else 0.0,
+    })
+    logger.info(
+        "Imported %(rows)d students in %(seconds).2fs (%(rows_per_sec).0f rows/sec): "
+        "%(inserted)d inserted, %(updated)d updated, %(unchanged)d unchanged, %(duplicates)d duplicates", result
+    )
+    return result
@@ -0,0 +1,228 @@
+# app/jobs.py
+
+import csv
+import datetime
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.background import WorkerThread
+from app.checkin import checkin_index
+from app.db import get_db, transaction
+from app.importer import import_roster, read_roster_csv
+from app.qr import WARMUP_ON_IMPORT, warm_up_qr_codes
+from app.search import name_index
+from app.stats import invalidate_stats
+from app.uploads import mark_upload_imported
+
+# SQLite has a single writer, so one import at a time per worker is plenty
+IMPORT_WORKERS = int(os.environ.get("IMPORT_WORKERS", 1))
+# A running job with no progress or heartbeat for this long is assumed
+# orphaned by a dead worker and may be picked up again
+STALE_AFTER_SECONDS = 300
+# How often a worker touches the jobs it is running, however long an
+# import step takes without reporting progress
+HEARTBEAT_INTERVAL = STALE_AFTER_SECONDS / 10
+PROGRESS_INTERVAL = 0.5
+# How often each worker looks for jobs it was not told about: ones queued
+# before it started, or orphaned by a worker that died mid-import
+POLL_INTERVAL = float(os.environ.get("IMPORT_POLL_SECONDS", 30))
+
+JOB_FIELDS = (
+    "id", "filename", "mode", "warm_qr", "status", "rows_total", "rows_parsed", "rows_committed",
+    "qr_total", "qr_generated", "inserted", "updated", "unchanged", "duplicates", "error",
+    "created_at", "started_at", "finished_at", "seconds",
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _now():
+    return datetime.datetime.now().isoformat(timespec="seconds")
+
+
+# ---------------- Job Table ----------------
+def create_import_job(filename, path, mode="upsert", warm_qr=False) -> int:
+    """Queue an import of an uploaded roster file and return the job id"""
+    with transaction() as conn:
+        cur = conn.execute("""
+            INSERT INTO import_jobs (filename, path, mode, warm_qr, status, created_at, updated_at)
+            VALUES (?, ?, ?, ?, 'queued', ?, ?)
+        """, (filename, path, mode, int(bool(warm_qr)), _now(), _now()))
+        return cur.lastrowid
+
+
+def get_import_job(job_id):
+    row = get_db().execute(f"SELECT {', '.join(JOB_FIELDS)} FROM import_jobs WHERE id = ?", (job_id,)).fetchone()
+    return dict(row) if row else None
+
+
+def update_import_job(job_id, **fields):
+    fields["updated_at"] = _now()
+    assignments = ", ".join(f"{name} = ?" for name in fields)
+    with transaction() as conn:
+        conn.execute(f"UPDATE import_jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+
+def claim_next_job():
+    """
+    Atomically take the oldest queued (or orphaned) job, so a job runs in
+    exactly one worker even when several are draining the table.
+    """
+    stale = (datetime.datetime.now() - datetime.timedelta(seconds=STALE_AFTER_SECONDS)).isoformat(timespec="seconds")
+    with transaction() as conn:
+        row = conn.execute("""
+            SELECT id, path, mode, warm_qr FROM import_jobs
+            WHERE status = 'queued' OR (status = 'running' AND updated_at < ?)
+            ORDER BY id LIMIT 1
+        """, (stale,)).fetchone()
+        if row is None:
+            return None
+        conn.execute(
+            "UPDATE import_jobs SET status = 'running', started_at = ?, updated_at = ? WHERE id = ?",
+            (_now(), _now(), row["id"])
+        )
+        return dict(row)
+
+
+def heartbeat_jobs(job_ids):
+    """Mark running jobs as alive, so claim_next_job does not take them over"""
+    placeholders = ",".join("?" * len(job_ids))
+    with transaction() as conn:
+        conn.execute(
+            f"UPDATE import_jobs SET updated_at = ? WHERE status = 'running' AND id IN ({placeholders})",
+            (_now(), *job_ids)
+        )
+
+
+def _count_rows(path) -> int:
+    """
+    Data rows in a CSV (the progress bar's total), counted the way
+    read_roster_csv yields them, so quoted newlines are not rows.
+    """
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        return sum(1 for values in reader if any(values))
+
+
+# ---------------- Job Runner ----------------
+class JobProgress:
+    """Progress callback that writes counters to the job row, at most every PROGRESS_INTERVAL"""
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self._pending = {}
+        self._written = 0.0
+
+    def __call__(self, force=False, **counts):
+        self._pending.update(counts)
+        now = time.monotonic()
+        if force or now - self._written >= PROGRESS_INTERVAL:
+            update_import_job(self.job_id, **self._pending)
+            self._pending = {}
+            self._written = now
+
+
+class ImportJobRunner:
+    """
+    Per-worker thread pool that drains the import_jobs table. Uploads only
+    save the file and queue a job, so no request waits for an import.
+    A poller also drains every POLL_INTERVAL, so jobs left behind by a
+    restart or a dead worker are picked up without a new upload, and it
+    sends the heartbeat for the jobs this worker is running.
+    """
+
+    def __init__(self, workers=IMPORT_WORKERS):
+        self.workers = workers
+        self._executor = None
+        self._poller = WorkerThread(self._poll, "import-job-poller")
+        self._lock = threading.Lock()
+        self._drain_queued = False
+        self._running = set()
+
+    def ensure_started(self):
+        # The pool is created with the poller, so each gunicorn worker owns both
+        with self._lock:
+            if not self._poller.running:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="import-job")
+                self._poller.ensure_started()
+
+    def submit(self):
+        """Wake a pool thread to run queued jobs"""
+        self.ensure_started()
+        self._submit_drain()
+
+    def _submit_drain(self):
+        # One queued drain is enough: it claims every job queued before it
+        # starts, so the executor's queue never grows during a long import
+        with self._lock:
+            if self._drain_queued:
+                return
+            self._drain_queued = True
+        self._executor.submit(self._drain)
+
+    def _poll(self):
+        next_drain = 0.0
+        while True:
+            with self._lock:
+                running = list(self._running)
+            if running:
+                try:
+                    heartbeat_jobs(running)
+                except Exception:
+                    logger.exception("Could not send the import job heartbeat")
+            if time.monotonic() >= next_drain:
+                self._submit_drain()
+                next_drain = time.monotonic() + POLL_INTERVAL
+            time.sleep(min(POLL_INTERVAL, HEARTBEAT_INTERVAL))
+
+    def _drain(self):
+        with self._lock:
+            self._drain_queued = False
+        while True:
+            try:
+                job = claim_next_job()
+            except Exception:
+                logger.exception("Could not claim an import job")
+                return
+            if job is None:
+                return
+            with self._lock:
+                self._running.add(job["id"])
+            try:
+                self._run(job)
+            finally:
+                with self._lock:
+                    self._running.discard(job["id"])
+
+    def _run(self, job):
+        started = time.perf_counter()
+        progress = JobProgress(job["id"])
+        try:
+            progress(force=True, rows_total=_count_rows(job["path"]))
+            result = import_roster(read_roster_csv(job["path"]), mode=job["mode"], progress=progress)
+            invalidate_stats()
+            name_index.invalidate()
+            checkin_index.invalidate()
+            progress(force=True, inserted=result["inserted"], updated=result["updated"], unchanged=result["unchanged"],
+                     duplicates=result["duplicates"])
+
+            if job["warm_qr"] or WARMUP_ON_IMPORT:
+                missing = get_db().execute("SELECT COUNT(*) FROM students WHERE qr_hash IS NULL").fetchone()[0]
+                progress(force=True, qr_total=missing)
+                warm_up_qr_codes(progress=lambda done: progress(qr_generated=done))
+                progress(force=True)
+
+            seconds = time.perf_counter() - started
+            mark_upload_imported(job["id"], result["rows"], seconds)
+            update_import_job(job["id"], status="done", finished_at=_now(), seconds=seconds)
+        except Exception as exc:
+            logger.exception("Import job %s failed", job["id"])
+            update_import_job(job["id"], status="failed", error=str(exc)[:500], finished_at=_now(),
+                              seconds=time.perf_counter() - started)
+
+
+runner = ImportJobRunner()
@@ -0,0 +1,259 @@
+# app/metrics.py
+
+import bisect
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from functools import wraps
+
+from flask import before_render_template, request, template_rendered
+
+from app.background import WorkerThread
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+METRICS_DIR = os.environ.get("METRICS_DIR", os.path.join(BASE_DIR, "..", "instance", "metrics"))
+FLUSH_INTERVAL = float(os.environ.get("METRICS_FLUSH_SECONDS", 5.0))
+# Opt-in: log statements slower than this many milliseconds with their plan
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", 0))
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1.0)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 500, 1000)
+SQL_STATEMENTS = ("SELECT", "INSERT", "UPDATE", "DELETE")
+
+# name -> (type, help, buckets)
+METRICS = {
+    "http_request_duration_seconds": ("histogram", "Time spent in the view and response hooks", LATENCY_BUCKETS),
+    "http_request_sql_queries": ("histogram", "SQL statements executed per request", COUNT_BUCKETS),
+    "http_request_sql_seconds": ("histogram", "Time spent executing SQL per request", LATENCY_BUCKETS),
+    "sqlite_query_duration_seconds": ("histogram", "SQL statement execution time", SQL_BUCKETS),
+    "template_render_seconds": ("histogram", "Jinja template render time", LATENCY_BUCKETS),
+    "render_duration_seconds": ("histogram", "QR code and PDF generation time", LATENCY_BUCKETS),
+    "sqlite_slow_queries_total": ("counter", "Statements slower than SLOW_QUERY_MS", None),
+}
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+
+# ---------------- Registry ----------------
+class Registry:
+    """
+    Per-process metric store. Histograms keep one count per bucket plus an
+    overflow slot and the running sum; labels are tuples of (key, value).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self.dirty = False
+
+    def observe(self, name, value, labels=()):
+        buckets = METRICS[name][2]
+        key = (name, labels)
+        with self._lock:
+            values = self._histograms.get(key)
+            if values is None:
+                values = self._histograms[key] = [0] * (len(buckets) + 1) + [0.0]
+            values[bisect.bisect_left(buckets, value)] += 1
+            values[-1] += value
+            self.dirty = True
+
+    def inc(self, name, labels=(), amount=1):
+        key = (name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+            self.dirty = True
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            self.dirty = False
+            return {
+                "histograms": [[name, list(labels), list(values)] for (name, labels), values in self._histograms.items()],
+                "counters": [[name, list(labels), value] for (name, labels), value in self._counters.items()],
+            }
+
+
+registry = Registry()
+
+
+def observe(name, value, **labels):
+    """Record one histogram value, e.g. a duration measured in a child process"""
+    registry.observe(name, value, tuple(sorted(labels.items())))
+
+
+def timed(name, **labels):
+    """Decorator recording a function's wall time in histogram `name`"""
+    key = tuple(sorted(labels.items()))
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                registry.observe(name, time.perf_counter() - started, key)
+        return wrapper
+    return decorator
+
+
+# ---------------- SQL ----------------
+def record_sql(sql, seconds):
+    """Called by the timed cursor in app.db for every statement"""
+    statement = sql.lstrip()[:6].upper()
+    if statement not in SQL_STATEMENTS:
+        statement = "OTHER"
+    registry.observe("sqlite_query_duration_seconds", seconds, (("statement", statement),))
+    state = getattr(_local, "request", None)
+    if state is not None:
+        state[1] += 1
+        state[2] += seconds
+
+
+def log_slow_query(conn, sql, params, seconds):
+    """Log a slow statement with its EXPLAIN QUERY PLAN (single statements only)"""
+    registry.inc("sqlite_slow_queries_total")
+    plan = "n/a"
+    if params is not None and sql.lstrip()[:6].upper() in SQL_STATEMENTS:
+        try:
+            # The base class method, so the EXPLAIN itself is not timed or logged
+            rows = sqlite3.Connection.execute(conn, "EXPLAIN QUERY PLAN " + sql, params).fetchall()
+            plan = "; ".join(row[3] for row in rows)
+        except Exception as exc:
+            plan = f"unavailable ({exc})"
+    logger.warning("Slow query (%.1f ms): %s | plan: %s", seconds * 1000, " ".join(sql.split()), plan)
+
+
+# ---------------- Flask Hooks ----------------
+def _before_render(sender, template, context, **extra):
+    _local.__dict__.setdefault("templates", []).append(time.perf_counter())
+
+
+def _after_render(sender, template, context, **extra):
+    stack = getattr(_local, "templates", None)
+    if stack:
+        registry.observe("template_render_seconds", time.perf_counter() - stack.pop(),
+                         (("template", template.name or "<string>"),))
+
+
+def init_app(app):
+    @app.before_request
+    def _start_request_timer():
+        writer.ensure_started()
+        # [started, sql statements, sql seconds]
+        _local.request = [time.perf_counter(), 0, 0.0]
+
+    @app.after_request
+    def _record_request(response):
+        state = getattr(_local, "request", None)
+        if state is not None:
+            _local.request = None
+            labels = (("endpoint", request.endpoint or "unmatched"), ("method", request.method))
+            registry.observe("http_request_duration_seconds", time.perf_counter() - state[0],
+                             labels + (("status", str(response.status_code)),))
+            registry.observe("http_request_sql_queries", state[1], labels)
+            registry.observe("http_request_sql_seconds", state[2], labels)
+        return response
+
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_after_render, app)
+
+
+# ---------------- Cross-Worker Aggregation ----------------
+def _snapshot_path(pid=None):
+    return os.path.join(METRICS_DIR, f"{pid or os.getpid()}.json")
+
+
+def write_snapshot():
+    """Atomically write this process's metrics where /metrics can sum them"""
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    path = _snapshot_path()
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(registry.snapshot(), f, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+
+def _write_snapshots():
+    """
+    Per-worker loop that writes the registry to METRICS_DIR every
+    FLUSH_INTERVAL seconds when it changed. Files of exited workers are
+    kept so totals never go backwards; gunicorn clears them on start.
+    """
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        if registry.dirty:
+            try:
+                write_snapshot()
+            except OSError:
+                logger.exception("Could not write metrics snapshot")
+
+
+writer = WorkerThread(_write_snapshots, "metrics-snapshot")
+
+
+def collect() -> dict:
+    """Sum the snapshots of every worker (including this one, freshly written)"""
+    write_snapshot()
+    histograms, counters = {}, {}
+    for entry in os.scandir(METRICS_DIR):
+        if not entry.name.endswith(".json"):
+            continue
+        try:
+            with open(entry.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for name, labels, values in data["histograms"]:
+            key = (name, tuple(tuple(pair) for pair in labels))
+            total = histograms.setdefault(key, [0] * len(values))
+            for i, value in enumerate(values):
+                total[i] += value
+        for name, labels, value in data["counters"]:
+            key = (name, tuple(tuple(pair) for pair in labels))
+            counters[key] = counters.get(key, 0) + value
+    return {"histograms": histograms, "counters": counters}
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+
+def render_metrics() -> str:
+    """All workers' metrics in the Prometheus text exposition format"""
+    data = collect()
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        if kind == "counter":
+            for (metric, labels), value in sorted(data["counters"].items()):
+                if metric == name:
+                    lines.append(f"{name}{_format_labels(labels)} {value}")
+            continue
+        for (metric, labels), values in sorted(data["histograms"].items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(buckets, values):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+            cumulative += values[len(buckets)]
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {values[-1]}")
+            lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+    return "\n".join(lines) + "\n"
@@ -1,11 +1,223 @@
-import sqlite3
+import datetime
+import hashlib
 import os
+import threading
+import time
+from app.db import get_db, transaction
 
-DB_PATH = os.path.join(os.path.dirname(__file__), '..', 'instance', 'students.db')
+# Change counters bumped by every roster import / attendance write
+ROSTER_VERSION = "roster"
+ATTENDANCE_VERSION = "attendance"
+SESSIONS_VERSION = "sessions"
+# How long a worker trusts a VersionChecked cache before re-reading its counter
+VERSION_CHECK_INTERVAL = 2.0
+
+# Version of the text encoded in student QR codes (see app.checkin); stored
+# QR images rendered under an older format are dropped by init_db.
+# 1: signed IEEE1 payload; 2: the same, signed with a dedicated key
+QR_PAYLOAD_FORMAT = 2
+QR_PAYLOAD_KEY = "qr_payload_format"
+
+# Roster fields that make up a student's row hash, in hashing order
+ROW_HASH_FIELDS = ("Name", "Domain", "Joining Date", "Category", "IEEE ID")
+
+def row_hash(row):
+    """Stable hash of a roster row, used to skip unchanged rows on upsert"""
+    payload = "\x1f".join(str(row.get(field, "")) for field in ROW_HASH_FIELDS)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def _ensure_column(c, table, column, decl):
+    """Add a column to an existing table if an older database lacks it"""
+    columns = {r[1] for r in c.execute(f"PRAGMA table_info({table})")}
+    if column not in columns:
+        c.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+def get_version(key, conn=None):
+    """Current value of a change counter (0 if it was never bumped)"""
+    row = (conn or get_db()).execute("SELECT value FROM app_meta WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else 0
+
+def bump_version(conn, key):
+    """
+    Increment a change counter inside the caller's transaction and return
+    the new value. Counters live in the database, so every worker sees them.
+    """
+    conn.execute("""
+        INSERT INTO app_meta (key, value) VALUES (?, 1)
+        ON CONFLICT(key) DO UPDATE SET value = value + 1
+    """, (key,))
+    return get_version(key, conn)
+
+class VersionChecked:
+    """
+    Base for per-worker caches derived from the database. The change
+    counter `version_key` is re-read at most every VERSION_CHECK_INTERVAL
+    seconds, so other workers' writes show up within that window, and
+    invalidate() makes the next read check at once. When the counter has
+    moved, _build() runs; otherwise _refresh() may apply incremental
+    changes, returning False to ask for a full rebuild.
+    """
+    version_key = ROSTER_VERSION
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._checked = 0.0
+
+    def _build(self):
+        raise NotImplementedError
+
+    def _refresh(self):
+        return True
+
+    def ensure_fresh(self):
+        """Bring the cache up to date if due; returns the counter it reflects"""
+        with self._lock:
+            now = time.monotonic()
+            if self._version is None or now - self._checked >= VERSION_CHECK_INTERVAL:
+                version = get_version(self.version_key)
+                if version != self._version or not self._refresh():
+                    self._build()
+                    self._version = version
+                self._checked = now
+            return self._version
+
+    def invalidate(self):
+        """Make the next read re-check the counter (e.g. after an import in this worker)"""
+        with self._lock:
+            self._checked = 0.0
+
+# ---------------- Secrets ----------------
+def get_secret(name, conn=None):
+    """A secret kept in the database, or None if it was never stored"""
+    row = (conn or get_db()).execute("SELECT value FROM app_secrets WHERE name = ?", (name,)).fetchone()
+    return row[0] if row else None
+
+def add_secret(conn, name, value):
+    """
+    Store a secret inside the caller's transaction unless one already
+    exists, and return the stored value (the first writer wins).
+    """
+    conn.execute("INSERT OR IGNORE INTO app_secrets (name, value) VALUES (?, ?)", (name, value))
+    return get_secret(name, conn)
+
+def set_secret(conn, name, value):
+    conn.execute("INSERT OR REPLACE INTO app_secrets (name, value) VALUES (?, ?)", (name, value))
+
+# ---------------- QR Store ----------------
+LEGACY_QR_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "qrcodes")
+
+def qr_hash(png):
+    return hashlib.sha256(png).hexdigest()
+
+def store_qr_png(conn, png):
+    """Save a QR PNG in the content-addressed store and return its hash"""
+    if not png:
+        return None
+    digest = qr_hash(png)
+    conn.execute("INSERT OR IGNORE INTO qr_codes (hash, png) VALUES (?, ?)", (digest, png))
+    return digest
+
+def get_qr_png(digest):
+    row = get_db().execute("SELECT png FROM qr_codes WHERE hash = ?", (digest,)).fetchone()
+    return row[0] if row else None
+
+def prune_qr_codes(conn):
+    """Drop stored QR images no student points at any more"""
+    conn.execute("""
+        DELETE FROM qr_codes
+        WHERE hash NOT IN (SELECT qr_hash FROM students WHERE qr_hash IS NOT NULL)
+    """)
+
+def _migrate_qr_blobs(conn):
+    """
+    Move QR images still held in students.qr_code into the QR store.
+    Import rows hold the PNG bytes; older rows hold a static/qrcodes filename.
+    """
+    rows = conn.execute(
+        "SELECT id, qr_code FROM students WHERE qr_code IS NOT NULL AND qr_hash IS NULL"
+    ).fetchall()
+    for student_id, qr_code in rows:
+        png = qr_code if isinstance(qr_code, bytes) else None
+        if png is None:
+            path = os.path.join(LEGACY_QR_FOLDER, os.path.basename(str(qr_code)))
+            if os.path.exists(path):
+                with open(path, "rb") as f:
+                    png = f.read()
+        digest = store_qr_png(conn, png) if png else None
+        conn.execute("UPDATE students SET qr_hash = ?, qr_code = NULL WHERE id = ?", (digest, student_id))
+    conn.commit()
+
+def _migrate_qr_payload(conn):
+    """
+    Forget QR images rendered with an older payload format so they are
+    re-rendered on next use. Printed legacy codes are still accepted at
+    check-in, so this only changes what new cards carry.
+    """
+    if get_version(QR_PAYLOAD_KEY, conn) >= QR_PAYLOAD_FORMAT:
+        return
+    conn.execute("UPDATE students SET qr_hash = NULL WHERE qr_hash IS NOT NULL")
+    prune_qr_codes(conn)
+    conn.execute("INSERT OR REPLACE INTO app_meta (key, value) VALUES (?, ?)", (QR_PAYLOAD_KEY, QR_PAYLOAD_FORMAT))
+    conn.commit()
+
+def _migrate_unique_ieee_id(conn):
+    """
+    Collapse students sharing an IEEE ID into the oldest row (which keeps
+    its attendance and takes the newest row's details), then make
+    idx_students_ieee_id UNIQUE so a roster can never hold duplicates.
+    """
+    indexes = {r[1]: r[2] for r in conn.execute("PRAGMA index_list(students)")}
+    if indexes.get("idx_students_ieee_id") == 1:
+        return
+    duplicates = conn.execute("""
+        SELECT ieee_id, MIN(id), MAX(id) FROM students
+        WHERE ieee_id IS NOT NULL GROUP BY ieee_id HAVING COUNT(*) > 1
+    """).fetchall()
+    for ieee_id, keep, newest in duplicates:
+        conn.execute("""
+            UPDATE students SET (name, domain, joining_date, category, row_hash, qr_hash) =
+                (SELECT name, domain, joining_date, category, row_hash, qr_hash FROM students WHERE id = ?)
+            WHERE id = ?
+        """, (newest, keep))
+        others = [r[0] for r in conn.execute(
+            "SELECT id FROM students WHERE ieee_id = ? AND id != ?", (ieee_id, keep)
+        )]
+        placeholders = ",".join("?" * len(others))
+        # Marks the kept row already has for an event win over the duplicates'
+        conn.execute(f"UPDATE OR IGNORE attendance SET student_id = ? WHERE student_id IN ({placeholders})", (keep, *others))
+        conn.execute(f"DELETE FROM attendance WHERE student_id IN ({placeholders})", others)
+        conn.execute(f"DELETE FROM students WHERE id IN ({placeholders})", others)
+    conn.execute("DROP INDEX IF EXISTS idx_students_ieee_id")
+    conn.execute("CREATE UNIQUE INDEX idx_students_ieee_id ON students(ieee_id)")
+    if duplicates:
+        prune_qr_codes(conn)
+        bump_version(conn, ROSTER_VERSION)
+    conn.commit()
 
 def init_db():
-    conn = sqlite3.connect(DB_PATH)
+    """
+    Create or migrate the schema. Run once per server start by gunicorn's
+    on_starting hook (or `flask init-db`), not on every worker boot.
+    """
+    conn = get_db()
     c = conn.cursor()
+
+    # CHANGE COUNTERS (cache invalidation shared across workers)
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS app_meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+
+    # SECRETS (kept with the data they protect, so every host agrees on them)
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS app_secrets (
+            name TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        )
+    """)
     
     # STUDENTS TABLE (Original)
     c.execute("""
@@ -16,9 +228,55 @@ def init_db():
             joining_date TEXT,
             category TEXT,
             ieee_id TEXT,
-            qr_code TEXT
+            qr_code TEXT,
+            row_hash TEXT,
+            qr_hash TEXT
         )
     """)
+    _ensure_column(c, "students", "row_hash", "TEXT")
+    _ensure_column(c, "students", "qr_hash", "TEXT")
+
+    # QR CODE STORE (content-addressed PNGs, kept out of the students rows)
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS qr_codes (
+            hash TEXT PRIMARY KEY,
+            png BLOB NOT NULL
+        ) WITHOUT ROWID
+    """)
+    _migrate_qr_blobs(conn)
+    _migrate_qr_payload(conn)
+    # Keyset order of the student picker (app.search.list_students)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_students_name_id ON students(name, id)")
+
+    # STUDENT SEARCH INDEX (trigram FTS5, kept in sync by triggers)
+    fts_exists = c.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='students_fts'"
+    ).fetchone()
+    c.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS students_fts USING fts5(
+            name, ieee_id, domain,
+            content='students', content_rowid='id', tokenize='trigram'
+        )
+    """)
+    c.executescript("""
+        CREATE TRIGGER IF NOT EXISTS students_fts_ai AFTER INSERT ON students BEGIN
+            INSERT INTO students_fts(rowid, name, ieee_id, domain)
+            VALUES (new.id, new.name, new.ieee_id, new.domain);
+        END;
+        CREATE TRIGGER IF NOT EXISTS students_fts_ad AFTER DELETE ON students BEGIN
+            INSERT INTO students_fts(students_fts, rowid, name, ieee_id, domain)
+            VALUES ('delete', old.id, old.name, old.ieee_id, old.domain);
+        END;
+        CREATE TRIGGER IF NOT EXISTS students_fts_au AFTER UPDATE OF name, ieee_id, domain ON students BEGIN
+            INSERT INTO students_fts(students_fts, rowid, name, ieee_id, domain)
+            VALUES ('delete', old.id, old.name, old.ieee_id, old.domain);
+            INSERT INTO students_fts(rowid, name, ieee_id, domain)
+            VALUES (new.id, new.name, new.ieee_id, new.domain);
+        END;
+    """)
+    if not fts_exists:
+        # Index students that were imported before the search index existed
+        c.execute("INSERT INTO students_fts(students_fts) VALUES ('rebuild')")
     
     # ATTENDANCE TABLE (NEW - Fixes ON CONFLICT and Missing Column errors)
     c.execute("""
@@ -28,28 +286,257 @@ def init_db():
             event_date TEXT,
             status TEXT,
             marked_by TEXT, 
+            version INTEGER NOT NULL DEFAULT 0,
+            marked_at TEXT,
             -- This constraint is required to use ON CONFLICT in routes.py
             UNIQUE(student_id, event_date)
         )
     """)
-    
+    # Databases created before marked_by / version / the UNIQUE constraint existed
+    _ensure_column(c, "attendance", "marked_by", "TEXT")
+    _ensure_column(c, "attendance", "version", "INTEGER NOT NULL DEFAULT 0")
+    _ensure_column(c, "attendance", "marked_at", "TEXT")
+    c.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_attendance_student_event ON attendance(student_id, event_date)")
+    # event_date-leading: serves per-event lookups and "changes since version N"
+    c.execute("CREATE INDEX IF NOT EXISTS idx_attendance_event_version ON attendance(event_date, version)")
+    # Serves "all changes since version N" for the analytics matrix
+    c.execute("CREATE INDEX IF NOT EXISTS idx_attendance_version ON attendance(version)")
+
+    # PER-EVENT SUMMARY (kept current by triggers, in the writing transaction)
+    summary_exists = c.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='event_attendance_summary'"
+    ).fetchone()
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS event_attendance_summary (
+            event_date TEXT PRIMARY KEY,
+            total INTEGER NOT NULL DEFAULT 0,
+            present INTEGER NOT NULL DEFAULT 0,
+            absent INTEGER NOT NULL DEFAULT 0,
+            max_version INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    """)
+    c.executescript("""
+        CREATE TRIGGER IF NOT EXISTS attendance_summary_ai AFTER INSERT ON attendance BEGIN
+            INSERT INTO event_attendance_summary (event_date, total, present, absent, max_version)
+            VALUES (new.event_date, 1, new.status IS 'Present', new.status IS 'Absent', new.version)
+            ON CONFLICT(event_date) DO UPDATE SET
+                total = total + 1,
+                present = present + excluded.present,
+                absent = absent + excluded.absent,
+                max_version = MAX(max_version, excluded.max_version);
+        END;
+        CREATE TRIGGER IF NOT EXISTS attendance_summary_ad AFTER DELETE ON attendance BEGIN
+            UPDATE event_attendance_summary SET
+                total = total - 1,
+                present = present - (old.status IS 'Present'),
+                absent = absent - (old.status IS 'Absent')
+            WHERE event_date = old.event_date;
+        END;
+        CREATE TRIGGER IF NOT EXISTS attendance_summary_au AFTER UPDATE OF event_date, status, version ON attendance BEGIN
+            UPDATE event_attendance_summary SET
+                total = total - 1,
+                present = present - (old.status IS 'Present'),
+                absent = absent - (old.status IS 'Absent')
+            WHERE event_date = old.event_date;
+            INSERT INTO event_attendance_summary (event_date, total, present, absent, max_version)
+            VALUES (new.event_date, 1, new.status IS 'Present', new.status IS 'Absent', new.version)
+            ON CONFLICT(event_date) DO UPDATE SET
+                total = total + 1,
+                present = present + excluded.present,
+                absent = absent + excluded.absent,
+                max_version = MAX(max_version, excluded.max_version);
+        END;
+    """)
+    if not summary_exists:
+        # Roll up attendance recorded before the summary table existed
+        c.execute("""
+            INSERT INTO event_attendance_summary (event_date, total, present, absent, max_version)
+            SELECT event_date, COUNT(*), SUM(status IS 'Present'), SUM(status IS 'Absent'), MAX(version)
+            FROM attendance GROUP BY event_date
+        """)
+
+    # ATTENDANCE SESSIONS (self-marking windows, shared by all workers)
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS attendance_sessions (
+            event_date TEXT PRIMARY KEY,
+            started_at TEXT NOT NULL,
+            expires_at TEXT NOT NULL,
+            closed_at TEXT
+        )
+    """)
+
+    # ROSTER IMPORT JOBS (queued by uploads, run by app.jobs)
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS import_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            filename TEXT,
+            path TEXT NOT NULL,
+            mode TEXT NOT NULL DEFAULT 'upsert',
+            warm_qr INTEGER NOT NULL DEFAULT 0,
+            status TEXT NOT NULL DEFAULT 'queued',
+            rows_total INTEGER,
+            rows_parsed INTEGER NOT NULL DEFAULT 0,
+            rows_committed INTEGER NOT NULL DEFAULT 0,
+            qr_total INTEGER NOT NULL DEFAULT 0,
+            qr_generated INTEGER NOT NULL DEFAULT 0,
+            inserted INTEGER,
+            updated INTEGER,
+            unchanged INTEGER,
+            duplicates INTEGER,
+            error TEXT,
+            created_at TEXT NOT NULL,
+            started_at TEXT,
+            finished_at TEXT,
+            updated_at TEXT NOT NULL,
+            seconds REAL
+        )
+    """)
+    _ensure_column(c, "import_jobs", "duplicates", "INTEGER")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_import_jobs_status ON import_jobs(status, id)")
+
+    # ROSTER UPLOADS (content-hashed, so identical re-uploads are skipped)
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS uploads (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            filename TEXT,
+            sha256 TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            row_count INTEGER,
+            duration REAL,
+            uploaded_at TEXT NOT NULL,
+            uploaded_by TEXT,
+            job_id INTEGER,
+            duplicate_of INTEGER,
+            roster_version INTEGER
+        )
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_uploads_uploaded_at ON uploads(uploaded_at)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_uploads_sha256 ON uploads(sha256)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_uploads_job_id ON uploads(job_id)")
+
+    # After the attendance table and its summary triggers exist, since
+    # collapsing duplicate students moves their attendance rows
+    _migrate_unique_ieee_id(conn)
+
     conn.commit()
-    conn.close()
+
+    # Needs the committed schema: it writes through transaction()
+    from app.checkin import sync_signing_key
+    sync_signing_key()
 
 def clear_and_insert_students(data):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
+    with transaction() as conn:
+        c = conn.cursor()
+        # Clear old data and insert new data in a single transaction
+        c.execute("DELETE FROM students")
+        c.executemany("""
+            INSERT INTO students (name, domain, joining_date, category, ieee_id, row_hash)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, ((row["Name"], row["Domain"], row["Joining Date"], row["Category"], row["IEEE ID"],
+               row_hash(row)) for row in data))
+        # QR codes are rendered again on first use (see app.qr)
+        prune_qr_codes(conn)
+        bump_version(conn, ROSTER_VERSION)
 
-    # Clear old data
-    c.execute("DELETE FROM students")
+def load_student_hashes():
+    """Return {ieee_id: (id, row_hash)} for the current roster"""
+    c = get_db().cursor()
+    c.execute("SELECT id, ieee_id, row_hash FROM students")
+    return {str(r[1]): (r[0], r[2]) for r in c.fetchall()}
 
-    # Insert new data
-    for row in data:
-        c.execute("""
-            INSERT INTO students (name, domain, joining_date, category, ieee_id, qr_code)
+def upsert_students(inserts, updates):
+    """
+    Apply a roster diff keyed on ieee_id in a single transaction.
+    `inserts` are new students; `updates` carry the existing row "id".
+    Stored QR codes are left alone: they encode only the IEEE ID, which
+    is the diff key. Existing student ids are kept, so attendance rows
+    stay attached.
+    """
+    with transaction() as conn:
+        c = conn.cursor()
+        c.executemany("""
+            INSERT INTO students (name, domain, joining_date, category, ieee_id, row_hash)
             VALUES (?, ?, ?, ?, ?, ?)
-        """, (row["Name"], row["Domain"], row["Joining Date"], row["Category"], row["IEEE ID"], row["QR"]))
-    conn.commit()
-    conn.close()
+        """, ((row["Name"], row["Domain"], row["Joining Date"], row["Category"], row["IEEE ID"], row["Hash"])
+              for row in inserts))
+        c.executemany("""
+            UPDATE students SET name = ?, domain = ?, joining_date = ?, category = ?, row_hash = ?
+            WHERE id = ?
+        """, ((row["Name"], row["Domain"], row["Joining Date"], row["Category"], row["Hash"], row["id"]) for row in updates))
+        if inserts or updates:
+            bump_version(conn, ROSTER_VERSION)
+
+# ---------------- Attendance ----------------
+def upsert_attendance(conn, records):
+    """
+    Mark attendance inside the caller's transaction.
+    `records` are (student_id, event_date, status, marked_by, marked_at)
+    tuples; a None marked_at means now. A record never overwrites a mark
+    with a later marked_at, so queued offline scans cannot undo newer ones.
+    Every written row is stamped with one new attendance version, which is
+    returned so clients can ask for changes made after it.
+    """
+    version = bump_version(conn, ATTENDANCE_VERSION)
+    now = datetime.datetime.now().isoformat(timespec="seconds")
+    conn.executemany("""
+        INSERT INTO attendance (student_id, event_date, status, marked_by, marked_at, version)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(student_id, event_date) DO UPDATE SET
+            status = excluded.status,
+            marked_by = COALESCE(excluded.marked_by, marked_by),
+            marked_at = excluded.marked_at,
+            version = excluded.version
+        WHERE marked_at IS NULL OR excluded.marked_at >= marked_at
+    """, (
+        (student_id, event_date, status, marked_by, marked_at or now, version)
+        for student_id, event_date, status, marked_by, marked_at in records
+    ))
+    return version
+
+def resolve_student_ids(student_ids=(), ieee_ids=()):
+    """
+    Look up which student ids exist and map IEEE IDs to student ids.
+    Returns (set of existing ids, {ieee_id: student_id}).
+    """
+    conn = get_db()
+    existing, by_ieee_id = set(), {}
+    student_ids, ieee_ids = list(student_ids), [str(i) for i in ieee_ids]
+    # Stay well under SQLite's bound-parameter limit
+    for i in range(0, len(student_ids), 500):
+        chunk = student_ids[i:i + 500]
+        rows = conn.execute(f"SELECT id FROM students WHERE id IN ({','.join('?' * len(chunk))})", chunk)
+        existing.update(r[0] for r in rows)
+    for i in range(0, len(ieee_ids), 500):
+        chunk = ieee_ids[i:i + 500]
+        rows = conn.execute(f"SELECT ieee_id, id FROM students WHERE ieee_id IN ({','.join('?' * len(chunk))})", chunk)
+        by_ieee_id.update((r[0], r[1]) for r in rows)
+    return existing, by_ieee_id
+
+def get_attendance_records(event_date, since=None, student_ids=None):
+    """
+    Attendance rows for an event, optionally only those changed after
+    version `since` or only for the given students.
+    """
+    sql = """
+        SELECT a.student_id, s.name, a.status, a.version
+        FROM attendance a
+        JOIN students s ON a.student_id = s.id
+        WHERE a.event_date = ?
+    """
+    params = [event_date]
+    if since is not None:
+        sql += " AND a.version > ?"
+        params.append(since)
+    if student_ids is not None:
+        sql += f" AND a.student_id IN ({','.join('?' * len(student_ids))})"
+        params.extend(student_ids)
+    return get_db().execute(sql + " ORDER BY a.version", params).fetchall()
 
-init_db()
\ No newline at end of file
+def get_attendance_summary(event_date):
+    """Totals for an event, read from the trigger-maintained summary row"""
+    row = get_db().execute(
+        "SELECT total, present, absent FROM event_attendance_summary WHERE event_date = ?", (event_date,)
+    ).fetchone()
+    if row is None:
+        return {"total": 0, "present": 0, "absent": 0}
+    return {"total": row["total"], "present": row["present"], "absent": row["absent"]}
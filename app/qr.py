@@ -0,0 +1,170 @@
+# app/qr.py
+
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from app.checkin import encode_qr_payload
+from app.db import get_db, transaction
+from app.metrics import observe
+from app.models import get_qr_png, store_qr_png
+from app.utils import generate_qr_code, render_qr_png
+
+# Rosters smaller than this are rendered serially; spinning up a process
+# pool costs more than it saves for a handful of QR codes.
+PARALLEL_THRESHOLD = int(os.environ.get("QR_PARALLEL_THRESHOLD", 200))
+QR_WORKERS = int(os.environ.get("QR_WORKERS", os.cpu_count() or 1))
+QR_CHUNKSIZE = 64
+
+MEMO_SIZE = int(os.environ.get("QR_MEMO_SIZE", 1024))
+WARMUP_BATCH = 500
+# Render every missing QR code in the background after each roster import
+WARMUP_ON_IMPORT = os.environ.get("QR_WARMUP", "0") == "1"
+# Render every missing QR code in the background when the first gunicorn
+# worker boots (see gunicorn.conf.py); `flask warm-qr` does it on demand
+WARMUP_ON_START = os.environ.get("QR_WARMUP_ON_START", "0") == "1"
+# Workers are multithreaded, and a forked child could inherit a lock held by
+# another thread (the metrics registry, the DB layer) and hang; spawn instead
+POOL_CONTEXT = multiprocessing.get_context("spawn")
+
+logger = logging.getLogger(__name__)
+
+
+# ---------------- QR Rendering ----------------
+def _render_qr(payload):
+    """Process pool task: (png, seconds), so the parent records the timing"""
+    started = time.perf_counter()
+    png = render_qr_png(payload)
+    return png, time.perf_counter() - started
+
+
+def render_qr_codes(pairs, workers: int = None) -> list:
+    """
+    Render QR PNGs for a list of (name, ieee_id) pairs.
+    Output order matches input order, and every PNG is produced by the same
+    render_qr_png call as the serial path, so the bytes are identical.
+    Payloads are signed here, so the children need neither the signing key
+    nor any app state.
+    """
+    pairs = list(pairs)
+    workers = workers or QR_WORKERS
+    if workers <= 1 or len(pairs) < PARALLEL_THRESHOLD:
+        return [generate_qr_code(name, ieee_id) for name, ieee_id in pairs]
+
+    payloads = [encode_qr_payload(ieee_id) for _, ieee_id in pairs]
+    with ProcessPoolExecutor(max_workers=workers, mp_context=POOL_CONTEXT) as pool:
+        results = list(pool.map(_render_qr, payloads, chunksize=QR_CHUNKSIZE))
+    for _, seconds in results:
+        observe("render_duration_seconds", seconds, kind="qr_code")
+    return [png for png, _ in results]
+
+
+# ---------------- Lazy QR Lookup ----------------
+class QRMemo:
+    """Bounded in-process LRU of (name, ieee_id) -> (qr_hash, png)"""
+
+    def __init__(self, maxsize=MEMO_SIZE):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+
+memo = QRMemo()
+
+
+def get_student_qr(student):
+    """
+    Return (qr_hash, png) for a student row (id, name, ieee_id, qr_hash),
+    rendering and storing the QR code the first time anyone asks for it.
+    """
+    key = (student["name"], str(student["ieee_id"]))
+    cached = memo.get(key)
+    if cached is not None:
+        return cached
+
+    png = get_qr_png(student["qr_hash"]) if student["qr_hash"] else None
+    if png is not None:
+        result = (student["qr_hash"], png)
+    else:
+        png = generate_qr_code(student["name"], student["ieee_id"])
+        with transaction() as conn:
+            digest = store_qr_png(conn, png)
+            conn.execute(
+                "UPDATE students SET qr_hash = ? WHERE id = ? AND name = ? AND ieee_id = ?",
+                (digest, student["id"], student["name"], student["ieee_id"])
+            )
+        result = (digest, png)
+
+    memo.put(key, result)
+    return result
+
+
+# ---------------- Background Warm-up ----------------
+_warmup_lock = threading.Lock()
+
+
+def warm_up_qr_codes(workers: int = None, batch_size: int = WARMUP_BATCH, progress=None) -> int:
+    """
+    Render and store QR codes for every student that does not have one yet.
+    `progress`, if given, is called with the running count after each batch.
+    """
+    if not _warmup_lock.acquire(blocking=False):
+        return 0  # a warm-up is already running in this worker
+    try:
+        done = 0
+        last_id = 0
+        while True:
+            rows = get_db().execute(
+                "SELECT id, name, ieee_id FROM students WHERE qr_hash IS NULL AND id > ? ORDER BY id LIMIT ?",
+                (last_id, batch_size)
+            ).fetchall()
+            if not rows:
+                break
+            last_id = rows[-1]["id"]
+            pngs = render_qr_codes(((r["name"], r["ieee_id"]) for r in rows), workers=workers)
+            with transaction() as conn:
+                for r, png in zip(rows, pngs):
+                    # Skip rows edited since they were read; they will be rendered lazily
+                    conn.execute(
+                        "UPDATE students SET qr_hash = ? WHERE id = ? AND qr_hash IS NULL AND name = ? AND ieee_id = ?",
+                        (store_qr_png(conn, png), r["id"], r["name"], r["ieee_id"])
+                    )
+            done += len(rows)
+            if progress:
+                progress(done)
+        logger.info("QR warm-up rendered %d codes", done)
+        return done
+    finally:
+        _warmup_lock.release()
+
+
+def start_warm_up():
+    """Run warm_up_qr_codes on a background thread"""
+    thread = threading.Thread(target=warm_up_qr_codes, name="qr-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+def init_app(app):
+    @app.cli.command("warm-qr")
+    def warm_qr_command():
+        """Render and store every missing QR code."""
+        print(f"Rendered {warm_up_qr_codes()} QR codes")
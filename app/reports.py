@@ -0,0 +1,125 @@
+# app/reports.py
+
+import csv
+import os
+import threading
+
+from app.db import get_db
+from app.models import ROSTER_VERSION, get_version
+from app.utils import generate_attendance_pdf
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.environ.get("REPORT_CACHE_DIR", os.path.join(BASE_DIR, "..", "instance", "report_cache"))
+CHUNK_BYTES = 64 * 1024
+CSV_HEADER = ("Student ID", "Name", "Status", "Marked By")
+FORMATS = {"csv": "text/csv", "pdf": "application/pdf"}
+
+
+# ---------------- Report Rows ----------------
+def report_version(event_date) -> str:
+    """
+    Identifies the current state of an event's report. Every attendance
+    write stamps a fresh attendance version, so the event's highest version
+    moves on any change; both values come from its summary row. Reports
+    also show student names, so the roster version is part of it too.
+    """
+    row = get_db().execute(
+        "SELECT max_version, total FROM event_attendance_summary WHERE event_date = ?", (event_date,)
+    ).fetchone()
+    attendance = f"{row['max_version']}-{row['total']}" if row else "0-0"
+    return f"{attendance}-{get_version(ROSTER_VERSION)}"
+
+
+def iter_report_rows(event_date):
+    """Stream an event's attendance rows straight from the cursor"""
+    cursor = get_db().execute("""
+        SELECT a.student_id, s.name, a.status, a.marked_by
+        FROM attendance a
+        JOIN students s ON a.student_id = s.id
+        WHERE a.event_date = ?
+        ORDER BY s.name, a.student_id
+    """, (event_date,))
+    try:
+        yield from cursor
+    finally:
+        cursor.close()
+
+
+class _Echo:
+    """File-like object whose write() hands the CSV line back to the caller"""
+
+    def write(self, line):
+        return line
+
+
+def iter_report_csv(event_date):
+    """Yield the report as CSV lines, one row at a time"""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_HEADER)
+    for row in iter_report_rows(event_date):
+        yield writer.writerow((row["student_id"], row["name"], row["status"], row["marked_by"] or ""))
+
+
+# ---------------- Report Cache ----------------
+def _cache_path(event_date, fmt, version):
+    return os.path.join(CACHE_DIR, f"attendance_{event_date}_{version}.{fmt}")
+
+
+def _tmp_path(path):
+    return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+
+def _publish(tmp_path, path, event_date, fmt):
+    """Move a finished report into the cache and drop older versions of it"""
+    os.replace(tmp_path, path)
+    prefix, suffix = f"attendance_{event_date}_", f".{fmt}"
+    for entry in os.scandir(CACHE_DIR):
+        if entry.path != path and entry.name.startswith(prefix) and entry.name.endswith(suffix):
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+
+def cached_report(event_date, fmt):
+    """(version, path) of the cached report, path None on a miss"""
+    version = report_version(event_date)
+    path = _cache_path(event_date, fmt, version)
+    return version, (path if os.path.exists(path) else None)
+
+
+def _stream_file(path):
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(CHUNK_BYTES)
+            if not chunk:
+                break
+            yield chunk
+
+
+def stream_report(event_date, fmt, version):
+    """
+    Render a report while streaming it, teeing the bytes into the cache so
+    the next request for the same attendance state is served from disk.
+    CSV is sent as rows are read, in constant memory. The PDF is not:
+    reportlab holds the whole document until save(), so it is built into
+    the cache's temporary file first and only then streamed back.
+    """
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = _cache_path(event_date, fmt, version)
+    tmp_path = _tmp_path(path)
+    try:
+        if fmt == "csv":
+            with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+                for line in iter_report_csv(event_date):
+                    f.write(line)
+                    yield line.encode("utf-8")
+        else:
+            with open(tmp_path, "wb") as f:
+                generate_attendance_pdf(iter_report_rows(event_date), event_date, output_path=f)
+            yield from _stream_file(tmp_path)
+        _publish(tmp_path, path, event_date, fmt)
+    finally:
+        # Client went away mid-stream or rendering failed
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
@@ -1,42 +1,54 @@
-from flask import render_template, request, redirect, url_for, session, flash, send_from_directory, jsonify, send_file
+from flask import render_template, request, redirect, url_for, session, flash, jsonify, send_file, Response, stream_with_context
 from app import app
 import os
-import pandas as pd
 import random
-import sqlite3
-from app.models import clear_and_insert_students
-# NOTE: Assuming generate_qr_code, generate_idcard_pdf, and generate_attendance_pdf exist in app.utils
-from app.utils import generate_qr_code, generate_idcard_pdf  
-import threading
+from app.checkin import InvalidPayload, checkin_index, parse_qr_payload
+from app.cards import export_cards_pdf, export_cards_zip, get_card_pdf, iter_export_students
+from app.db import get_db, transaction
+from app.jobs import create_import_job, get_import_job, runner as import_runner
+from app.events import event_stream, format_event, watcher
+from app.metrics import METRICS_TOKEN, render_metrics
+from app.models import (
+    ATTENDANCE_VERSION, ROSTER_VERSION, get_attendance_records, get_attendance_summary, get_version,
+    resolve_student_ids, upsert_attendance
+)
+from app.qr import get_student_qr
+from app.reports import FORMATS as REPORT_FORMATS, cached_report, stream_report
+from app.search import PICKER_PAGE_SIZE, list_students, name_index, search_students
+from app.sessions import (
+    REPORTS_FOLDER, SESSION_MINUTES, get_active_session, latest_active_event_date, scheduler, start_session
+)
+from app.stats import get_cached_stats, invalidate_stats
+from app.uploads import find_duplicate_upload, recent_uploads as list_recent_uploads, record_upload, save_upload
+from app.writebehind import ENABLED as write_behind_enabled, attendance_queue
 import io
-import csv
 import datetime
 
 # ---------------- CONFIG ----------------
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DATABASE = os.path.join(BASE_DIR, "../instance/students.db")
-UPLOAD_FOLDER = os.path.join(BASE_DIR, "../uploads")
+UPLOAD_FOLDER = os.environ.get("UPLOAD_FOLDER", os.path.join(BASE_DIR, "../uploads"))
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-os.makedirs("static/attendance_reports", exist_ok=True)
+
+SEARCH_PAGE_SIZE = 20
 
 ADMIN_USERNAME = "admin"
 ADMIN_PASSWORD = "admin123"
 
+REPORTS_WATCH_KEY = "reports_dir"
+watcher.watch_dir(REPORTS_WATCH_KEY, REPORTS_FOLDER)
+
+def list_attendance_reports():
+    if not os.path.exists(REPORTS_FOLDER):
+        return []
+    return [f for f in os.listdir(REPORTS_FOLDER) if not f.endswith(".tmp")]
+
 # ---------------- ATTENDANCE ----------------
-active_attendance = {}
-
-def end_attendance(event_date):
-    """Save attendance report and close session after timeout"""
-    if event_date in active_attendance:
-        output = io.StringIO()
-        writer = csv.writer(output)
-        writer.writerow(["Student ID", "Status"])
-        for sid, status in active_attendance[event_date].items():
-            writer.writerow([sid, status])
-        report_file = f"attendance_{event_date}.csv"
-        with open(os.path.join("static/attendance_reports", report_file), "w", newline="") as f:
-            f.write(output.getvalue())
-        del active_attendance[event_date]
+@app.before_request
+def _start_background_workers():
+    # One expiry scheduler and import runner per worker process; a no-op
+    # after the first request
+    scheduler.ensure_started()
+    import_runner.ensure_started()
 
 # ---------------- HOME ----------------
 @app.route('/')
@@ -54,7 +66,7 @@ def home():
         {"title": "IEEE Day Celebration", "date": "2025-10-17", "description": "Mark your calendars for IEEE Day 2025 events."}
     ]
 
-    active_event_date = sorted(active_attendance.keys())[-1] if active_attendance else None
+    active_event_date = latest_active_event_date()
 
     return render_template(
         "home.html",
@@ -87,83 +99,50 @@ def admin_dashboard():
     if request.method == "POST":
         file = request.files.get("csv_file")
         if file and file.filename.endswith(".csv"):
-            filepath = os.path.join(UPLOAD_FOLDER, file.filename)
-            file.save(filepath)
-
-            df = pd.read_csv(filepath)
-            df.columns = df.columns.str.strip().str.lower()
-
-            students = []
-            for _, row in df.iterrows():
-                # REVERTED FIX: Using 'ieee_id' column from the cleaned CSV, assuming the KeyError is now fixed by user.
-                unique_id = row["ieee_id"]
-                
-                qr_file = generate_qr_code(row["name"], unique_id)
-                students.append({
-                    "Name": row["name"],
-                    "Domain": row.get("domain", ""),
-                    "Joining Date": row.get("joining_date", ""),
-                    "Category": row.get("category", ""),
-                    "IEEE ID": unique_id, 
-                    "QR": qr_file
-                })
-
-            clear_and_insert_students(students)
-            flash("CSV uploaded and QR codes generated successfully!", "success")
+            sha256, size, filepath = save_upload(file, UPLOAD_FOLDER)
+
+            mode = "replace" if request.form.get("import_mode") == "replace" else "upsert"
+            duplicate = find_duplicate_upload(sha256, mode)
+            if duplicate:
+                record_upload(file.filename, sha256, size, duplicate_of=duplicate["id"])
+                message = (f"This file is identical to {duplicate['filename']} (uploaded {duplicate['uploaded_at']}); "
+                           f"it has already been imported, so the import was skipped.")
+                if _wants_json():
+                    return jsonify({"skipped": True, "duplicate_of": duplicate["id"], "message": message})
+                flash(message, "info")
+                return redirect(url_for("admin_dashboard"))
+
+            # The import runs on a background pool; the browser polls the job
+            job_id = create_import_job(file.filename, filepath, mode=mode, warm_qr=bool(request.form.get("warm_qr")))
+            record_upload(file.filename, sha256, size, job_id=job_id)
+            import_runner.submit()
+            if _wants_json():
+                return jsonify({"job_id": job_id, "status_url": url_for("import_job_status", job_id=job_id)}), 202
+            flash(f"CSV uploaded! Import job #{job_id} is running in the background.", "success")
+        elif _wants_json():
+            return jsonify({"error": "Please upload a valid CSV file."}), 400
         else:
             flash("Please upload a valid CSV file.", "danger")
+        return redirect(url_for("admin_dashboard"))
 
     # ---------------- Attendance Files ----------------
-    attendance_files = os.listdir('static/attendance_reports') if os.path.exists('static/attendance_reports') else []
+    attendance_files = list_attendance_reports()
 
     # ---------------- Recent CSV Uploads ----------------
-    recent_uploads = []
-    if os.path.exists(UPLOAD_FOLDER):
-        for f in sorted(os.listdir(UPLOAD_FOLDER), reverse=True)[:5]:
-            recent_uploads.append({
-                "filename": f,
-                "uploaded_on": pd.to_datetime(os.path.getmtime(os.path.join(UPLOAD_FOLDER, f)), unit='s').strftime("%Y-%m-%d %H:%M:%S"),
-                "uploaded_by": "Admin"
-            })
+    recent_uploads = list_recent_uploads(limit=5)
 
     # ---------------- Statistics + Search ----------------
-    conn = sqlite3.connect(DATABASE)
-    c = conn.cursor()
-
-    c.execute("SELECT COUNT(*) FROM students")
-    total_students = c.fetchone()[0]
-
-    c.execute("SELECT COUNT(*) FROM students WHERE Category='Tech'")
-    tech = c.fetchone()[0]
-
-    c.execute("SELECT COUNT(*) FROM students WHERE Category='Non-Tech'")
-    non_tech = c.fetchone()[0]
-
-    societies_list = ["CASS", "COMSOC", "WIE", "Sensor", "CS"]
-    society_counts = {}
-    for soc in societies_list:
-        c.execute("SELECT COUNT(*) FROM students WHERE Domain LIKE ?", (f"%{soc}%",))
-        society_counts[soc.lower()] = c.fetchone()[0]
+    _, stats = get_cached_stats()
 
     query = request.args.get("query")
+    page = max(request.args.get("page", 1, type=int), 1)
     search_results = []
+    has_next = False
     if query:
-        # FIX 2: Changed SQL column reference to 'ieee_id'
-        c.execute(
-            "SELECT id, name, Domain, ieee_id FROM students WHERE name LIKE ? OR ieee_id LIKE ?",  
-            (f"%{query}%", f"%{query}%")
-        )
-        search_results = [{"id": r[0], "name": r[1], "domain": r[2], "ieee_id": r[3]} for r in c.fetchall()]
-
-    conn.close()
-
-    stats = {
-        "total_students": total_students,
-        "total_id_cards": total_students,
-        "tech": tech,
-        "non_tech": non_tech,
-        **society_counts
-    }
+        # Fetch one extra row to know whether a next page exists
+        search_results = search_students(query, limit=SEARCH_PAGE_SIZE + 1, offset=(page - 1) * SEARCH_PAGE_SIZE)
+        has_next = len(search_results) > SEARCH_PAGE_SIZE
+        search_results = search_results[:SEARCH_PAGE_SIZE]
 
     # -------- AJAX live refresh support --------
     if request.args.get("ajax") == "1":
@@ -179,9 +158,27 @@ def admin_dashboard():
         attendance_files=attendance_files,
         stats=stats,
         recent_uploads=recent_uploads,
-        search_results=search_results
+        search_results=search_results,
+        query=query,
+        page=page,
+        has_next=has_next
     )
 
+def _wants_json():
+    return request.accept_mimetypes.best == "application/json"
+
+@app.route("/admin/import_jobs/<int:job_id>")
+def import_job_status(job_id):
+    """Progress of a roster import: rows parsed, QR codes generated, rows committed"""
+    if not session.get("admin"):
+        return jsonify({"error": "Unauthorized"}), 401
+    job = get_import_job(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown import job"}), 404
+    response = jsonify(job)
+    response.headers["Cache-Control"] = "no-store"
+    return response
+
 @app.route("/admin/logout")
 def admin_logout():
     session.pop("admin", None)
@@ -189,98 +186,68 @@ def admin_logout():
     return redirect(url_for("admin_login"))
 
 # ---------------- ATTENDANCE ROUTES ----------------
+def _record_dict(record):
+    return {"student_id": record["student_id"], "name": record["name"], "status": record["status"]}
+
+def _mark_response(event_date, student_id, version):
+    """JSON delta for a single mark: the changed row, new counters and version"""
+    rows = get_attendance_records(event_date, student_ids=[student_id])
+    return jsonify({
+        "row": _record_dict(rows[0]) if rows else None,
+        "summary": get_attendance_summary(event_date),
+        "version": version
+    })
+
 @app.route("/attendance/<event_date>", methods=["GET", "POST"])
 def attendance(event_date):
     if request.method == "POST":
         student_id = request.form["student_id"]
         status = request.form["status"]
 
-        conn = sqlite3.connect(DATABASE)
-        c = conn.cursor()
-        c.execute(
-            "INSERT OR REPLACE INTO attendance (event_date, student_id, status) VALUES (?, ?, ?)",
-            (event_date, student_id, status)
-        )
-        conn.commit()
-
-        c.execute(
-            "SELECT a.student_id, s.name, a.status FROM attendance a JOIN students s ON a.student_id = s.id WHERE event_date = ?",
-            (event_date,)
-        )
-        records = c.fetchall()
+        with transaction() as conn:
+            version = upsert_attendance(conn, [(student_id, event_date, status, None, None)])
+        return _mark_response(event_date, student_id, version)
 
-        c.execute(
-            "SELECT COUNT(*), SUM(CASE WHEN status='Present' THEN 1 ELSE 0 END), SUM(CASE WHEN status='Absent' THEN 1 ELSE 0 END) FROM attendance WHERE event_date = ?",
-            (event_date,)
-        )
-        total, present, absent = c.fetchone()
-        conn.close()
-
-        table_html = render_template("attendance_table.html", attendance_records=records)
-        return jsonify({
-            "summary": {"total": total or 0, "present": present or 0, "absent": absent or 0},
-            "table_html": table_html
-        })
-
-    # GET → Render full page
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
-
-    c.execute("SELECT id, name FROM students")
-    students = c.fetchall()
-
-    c.execute(
-        "SELECT a.student_id, s.name, a.status FROM attendance a JOIN students s ON a.student_id = s.id WHERE event_date = ?",
-        (event_date,)
-    )
-    attendance_records = c.fetchall()
-
-    c.execute(
-        "SELECT COUNT(*), SUM(CASE WHEN status='Present' THEN 1 ELSE 0 END), SUM(CASE WHEN status='Absent' THEN 1 ELSE 0 END) FROM attendance WHERE event_date = ?",
-        (event_date,)
-    )
-    total, present, absent = c.fetchone()
-    conn.close()
-
-    summary = {"total": total or 0, "present": present or 0, "absent": absent or 0}
-    return render_template("attendance.html", event_date=event_date, students=students, attendance_records=attendance_records, attendance_summary=summary)
+    # GET → Render full page; students are picked through /api/students
+    version = get_version(ATTENDANCE_VERSION)
+    attendance_records = get_attendance_records(event_date)
+    summary = get_attendance_summary(event_date)
+    return render_template("attendance.html", event_date=event_date, attendance_records=attendance_records, attendance_summary=summary, attendance_version=version)
 
 @app.route("/attendance/refresh/<event_date>")
 def attendance_refresh(event_date):
-    """Return updated attendance table + summary (for AJAX auto-refresh)"""
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
-
-    c.execute(
-        "SELECT a.student_id, s.name, a.status FROM attendance a JOIN students s ON a.student_id = s.id WHERE event_date = ?",
-        (event_date,)
-    )
-    attendance_records = c.fetchall()
-
-    c.execute(
-        "SELECT COUNT(*), SUM(CASE WHEN status='Present' THEN 1 ELSE 0 END), SUM(CASE WHEN status='Absent' THEN 1 ELSE 0 END) FROM attendance WHERE event_date = ?",
-        (event_date,)
-    )
-    total, present, absent = c.fetchone()
-    conn.close()
+    """
+    Return attendance changes + summary (for AJAX auto-refresh).
+    With ?since=<version> only rows changed after that version are sent;
+    without it the full table is rendered.
+    """
+    if not session.get("admin"):
+        return jsonify({"error": "Unauthorized"}), 401
+    since = request.args.get("since", type=int)
+    # Read the version before the rows: a change racing with this request is
+    # then re-sent next time rather than skipped
+    version = get_version(ATTENDANCE_VERSION)
+    summary = get_attendance_summary(event_date)
+
+    if since is not None:
+        changes = get_attendance_records(event_date, since=since)
+        return jsonify({
+            "summary": summary,
+            "changes": [_record_dict(r) for r in changes],
+            "version": version
+        })
 
+    attendance_records = get_attendance_records(event_date)
     table_html = render_template("attendance_table.html", attendance_records=attendance_records)
     return jsonify({
-        "summary": {"total": total or 0, "present": present or 0, "absent": absent or 0},
-        "table_html": table_html
+        "summary": summary,
+        "table_html": table_html,
+        "version": version
     })
 
 # ---------------- SEARCH ----------------
 @app.route("/search", methods=["GET", "POST"])
 def search():
-    conn = sqlite3.connect(DATABASE)
-    c = conn.cursor()
-    c.execute("SELECT name FROM students ORDER BY name")
-    all_names = [row[0] for row in c.fetchall()]
-    conn.close()
-
     # Generate CAPTCHA numbers
     if "captcha_num1" not in session or "captcha_num2" not in session:
         session["captcha_num1"] = random.randint(1, 5)
@@ -301,34 +268,26 @@ def search():
             session["captcha_num2"] = random.randint(1, 5)
             return render_template(
                 "search.html",
-                all_student_names=all_names,
                 num1=session["captcha_num1"],
                 num2=session["captcha_num2"],
                 student=None
             )
 
         # Search student
-        conn = sqlite3.connect(DATABASE)
+        conn = get_db()
         c = conn.cursor()
+        row = None
         if ieee_id:
-            c.execute("SELECT id, name, ieee_id, Domain, [Joining_Date], Category, qr_code FROM students WHERE ieee_id = ?", (ieee_id,))
-        else:
-            c.execute("SELECT id, name, ieee_id, Domain, [Joining_Date], Category, qr_code FROM students WHERE name LIKE ?", (f"%{name}%",))
-        row = c.fetchone()
-        conn.close()
+            c.execute("SELECT id, name, ieee_id, Domain, [Joining_Date], Category, qr_hash FROM students WHERE ieee_id = ?", (ieee_id,))
+            row = c.fetchone()
+        elif name:
+            # Best-ranked name match from the search index
+            matches = search_students(name, limit=1, columns=("name",))
+            if matches:
+                c.execute("SELECT id, name, ieee_id, Domain, [Joining_Date], Category, qr_hash FROM students WHERE id = ?", (matches[0]["id"],))
+                row = c.fetchone()
 
         if row:
-            # QR Code Fix: Robustly decode qr_code from bytes (row[6]) to string
-            qr_code_value = row[6]
-            
-            if isinstance(qr_code_value, bytes):
-                try:
-                    # Try standard UTF-8 decoding first
-                    qr_code_value = qr_code_value.decode('utf-8')
-                except UnicodeDecodeError:
-                    # Fall back to latin-1 to safely convert byte data (like PNG headers) to string
-                    qr_code_value = qr_code_value.decode('latin-1')
-
             student = {
                 "id": row[0],
                 "name": row[1],
@@ -336,7 +295,8 @@ def search():
                 "domain": row[3],
                 "joining_date": row[4],
                 "category": row[5],
-                "qr_code": qr_code_value, # Use the robustly decoded string value
+                # Versioned by content hash, so the image can be cached for good
+                "qr_url": url_for("qr_image", student_id=row[0], v=row[6]),
                 "download_count": random.randint(1, 10)
             }
             session["captcha_num1"] = random.randint(1, 5)
@@ -349,70 +309,228 @@ def search():
 
     return render_template(
         "search.html",
-        all_student_names=all_names,
         num1=num1,
         num2=num2,
         student=None
     )
 
+MAX_SUGGESTIONS = 25
+
+@app.route("/api/students/suggest")
+def suggest_students():
+    """Name autocomplete for the search page, served from the in-memory prefix index"""
+    k = min(max(request.args.get("k", 10, type=int), 1), MAX_SUGGESTIONS)
+    return jsonify({"suggestions": name_index.suggest(request.args.get("q", ""), k)})
+
+@app.route("/api/students")
+def student_picker():
+    """
+    Keyset-paginated student lookup for the attendance pickers.
+    ?q= matches name, IEEE ID or domain; ?domain= and ?ieee_id= filter
+    exactly; ?after= is the cursor of the previous page.
+    """
+    try:
+        rows, cursor = list_students(
+            request.args.get("q", ""),
+            domain=request.args.get("domain"),
+            ieee_id=request.args.get("ieee_id"),
+            after=request.args.get("after"),
+            limit=request.args.get("limit", PICKER_PAGE_SIZE, type=int),
+        )
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+    if not session.get("admin"):
+        # Students picking their own name only need to see names
+        rows = [{"id": r["id"], "name": r["name"], "domain": r["domain"]} for r in rows]
+    return jsonify({"students": rows, "next": cursor})
+
+# ---------------- METRICS ----------------
+@app.route("/metrics")
+def metrics_endpoint():
+    """Prometheus scrape target, summed across all gunicorn workers"""
+    if METRICS_TOKEN and request.headers.get("Authorization") != f"Bearer {METRICS_TOKEN}":
+        return Response("Unauthorized\n", status=401, mimetype="text/plain")
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4; charset=utf-8")
+
 # ---------------- ADMIN AJAX STATS ----------------
 @app.route("/admin/get_stats")
 def get_stats():
-    conn = sqlite3.connect(DATABASE)
-    c = conn.cursor()
+    version, stats = get_cached_stats()
+    response = jsonify(stats)
+    # Polling tabs revalidate with If-None-Match and get an empty 304
+    response.set_etag(f"stats-{version}")
+    response.headers["Cache-Control"] = "no-cache"
+    return response.make_conditional(request)
 
-    c.execute("SELECT COUNT(*) FROM students")
-    total_students = c.fetchone()[0]
+@app.route("/admin/get_attendance_reports")
+def get_attendance_reports():
+    attendance_files = list_attendance_reports()
+    return jsonify({"attendance_files": attendance_files})
 
-    c.execute("SELECT COUNT(*) FROM students WHERE Category='Tech'")
-    tech = c.fetchone()[0]
+@app.route("/admin/write_behind_stats")
+def write_behind_stats():
+    """Queue depth and flush latency of the self-mark write-behind buffer"""
+    if not session.get("admin"):
+        return jsonify({"error": "Unauthorized"}), 401
+    return jsonify(attendance_queue.stats())
 
-    c.execute("SELECT COUNT(*) FROM students WHERE Category='Non-Tech'")
-    non_tech = c.fetchone()[0]
+# ---------------- ADMIN ANALYTICS ----------------
+# app.analytics pulls in numpy, so it is imported on first use rather than at boot
 
-    societies_list = ["CASS", "COMSOC", "WIE", "Sensor", "CS"]
-    society_counts = {}
-    for soc in societies_list:
-        c.execute("SELECT COUNT(*) FROM students WHERE Domain LIKE ?", (f"%{soc}%",))
-        society_counts[soc.lower()] = c.fetchone()[0]
+def _analytics_window():
+    return {"start": request.args.get("from") or None, "end": request.args.get("to") or None}
 
-    conn.close()
+@app.route("/admin/analytics/eligibility")
+def analytics_eligibility():
+    """Students who attended at least ?threshold= (default 0.75) of the events ?from=&to="""
+    if not session.get("admin"):
+        return jsonify({"error": "Unauthorized"}), 401
+    from app import analytics
+    threshold = min(max(request.args.get("threshold", 0.75, type=float), 0.0), 1.0)
+    limit = request.args.get("limit", analytics.DEFAULT_LIMIT, type=int)
+    return jsonify(analytics.eligibility(threshold, limit=limit, **_analytics_window()))
+
+@app.route("/admin/analytics/streaks")
+def analytics_streaks():
+    if not session.get("admin"):
+        return jsonify({"error": "Unauthorized"}), 401
+    from app import analytics
+    limit = request.args.get("limit", analytics.DEFAULT_LIMIT, type=int)
+    return jsonify(analytics.streaks(limit=limit, **_analytics_window()))
 
-    stats = {
-        "total_students": total_students,
-        "tech": tech,
-        "non_tech": non_tech,
-        **society_counts
-    }
-    return jsonify(stats)
+@app.route("/admin/analytics/domains")
+def analytics_domains():
+    if not session.get("admin"):
+        return jsonify({"error": "Unauthorized"}), 401
+    from app import analytics
+    return jsonify(analytics.domain_participation(**_analytics_window()))
+
+# ---------------- LIVE UPDATES (SSE) ----------------
+def _sse_response(stream):
+    return Response(stream, mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"  # stop reverse proxies from buffering the stream
+    })
 
-@app.route("/admin/get_attendance_reports")
-def get_attendance_reports():
-    attendance_files = os.listdir('static/attendance_reports') if os.path.exists('static/attendance_reports') else []
-    return jsonify({"attendance_files": attendance_files})
+@app.route("/attendance/stream/<event_date>")
+def attendance_stream(event_date):
+    """Push attendance changes for one event as they are committed"""
+    if not session.get("admin"):
+        return jsonify({"error": "Unauthorized"}), 401
+    # EventSource resends the last event id on reconnect, so nothing is missed
+    since = request.headers.get("Last-Event-ID", type=int)
+    if since is None:
+        since = request.args.get("since", 0, type=int)
+    state = {"version": since}
+
+    def on_change(snapshot):
+        if snapshot.get(ATTENDANCE_VERSION, 0) <= state["version"]:
+            return
+        changes = get_attendance_records(event_date, since=state["version"])
+        state["version"] = max([snapshot[ATTENDANCE_VERSION]] + [r["version"] for r in changes])
+        if changes:
+            yield format_event("attendance", {
+                "changes": [_record_dict(r) for r in changes],
+                "summary": get_attendance_summary(event_date),
+                "version": state["version"]
+            }, event_id=state["version"])
+
+    return _sse_response(event_stream(on_change))
+
+@app.route("/admin/stream")
+def dashboard_stream():
+    """Push dashboard stats and the report list whenever they change"""
+    if not session.get("admin"):
+        return jsonify({"error": "Unauthorized"}), 401
+
+    state = {"roster": None, "reports": None}
+
+    def on_change(snapshot):
+        roster = snapshot.get(ROSTER_VERSION, 0)
+        if roster != state["roster"]:
+            state["roster"] = roster
+            invalidate_stats()
+            version, stats = get_cached_stats()
+            yield format_event("stats", stats, event_id=version)
+        reports = snapshot.get(REPORTS_WATCH_KEY)
+        if reports != state["reports"]:
+            state["reports"] = reports
+            yield format_event("reports", {"attendance_files": list_attendance_reports()})
+
+    return _sse_response(event_stream(on_change))
+
+# ---------------- QR IMAGES ----------------
+QR_MAX_AGE = 3600
+QR_IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+@app.route("/qr/<int:student_id>.png")
+def qr_image(student_id):
+    """Serve a student's QR PNG from the QR store"""
+    student = get_db().execute(
+        "SELECT id, name, ieee_id, qr_hash FROM students WHERE id = ?", (student_id,)
+    ).fetchone()
+    if not student:
+        return "QR code not found", 404
+
+    # Rendered on first request, then served from the memo / QR store
+    digest, png = get_student_qr(student)
+
+    # A URL carrying ?v=<hash> names the exact image content, so it never changes
+    immutable = request.args.get("v") == digest
+    response = send_file(
+        io.BytesIO(png),
+        mimetype="image/png",
+        etag=digest,
+        conditional=True,
+        max_age=QR_IMMUTABLE_MAX_AGE if immutable else QR_MAX_AGE
+    )
+    response.cache_control.immutable = immutable or None
+    return response
 
 @app.route("/download/<int:student_id>")
 def user_download(student_id):
-    conn = sqlite3.connect("instance/students.db")
+    conn = get_db()
     c = conn.cursor()
-    c.execute("SELECT * FROM students WHERE id = ?", (student_id,))
+    c.execute("SELECT id, name, ieee_id, domain, joining_date, category, qr_hash FROM students WHERE id = ?", (student_id,))
     student = c.fetchone()
-    conn.close()
 
     if not student:
         flash("Student not found", "danger")
         return redirect(url_for("search"))
 
-    # FIX 3: Added student[2] (the ieee_id/unique_id) to the function call to fix TypeError
-    pdf_bytes = generate_idcard_pdf(student, student[2])
-    
+    # Rendered cards are cached on disk; the cache key doubles as the ETag so
+    # repeat downloads are answered with 304 Not Modified
+    card_key, pdf_path = get_card_pdf(student)
     return send_file(
-        io.BytesIO(pdf_bytes),
+        pdf_path,
         as_attachment=True,
-        download_name=f"idcard_{student[1]}.pdf",
-        mimetype="application/pdf"
+        download_name=f"idcard_{student['name']}.pdf",
+        mimetype="application/pdf",
+        etag=card_key,
+        conditional=True,
+        max_age=0
     )
 
+@app.route("/admin/idcards/export")
+def export_idcards():
+    """Bulk ID card export for printing, filtered by domain and/or category"""
+    if not session.get("admin"):
+        return redirect(url_for("admin_login"))
+
+    fmt = request.args.get("format", "zip")
+    per_page = min(max(request.args.get("per_page", 8, type=int), 1), 12)
+    students = iter_export_students(request.args.get("domain"), request.args.get("category"))
+
+    if fmt == "pdf":
+        stream, mimetype, download_name = export_cards_pdf(students, per_page), "application/pdf", "idcards.pdf"
+    else:
+        stream, mimetype, download_name = export_cards_zip(students, per_page), "application/zip", "idcards.zip"
+
+    # The generator reads the database after the view returns; keep the context
+    return Response(stream_with_context(stream), mimetype=mimetype, headers={
+        "Content-Disposition": f"attachment; filename={download_name}"
+    })
+
 @app.route("/attendance/")
 def attendance_page():
     event_date = request.args.get("event_date")
@@ -420,50 +538,22 @@ def attendance_page():
     if not event_date:
         return "❌ Please provide ?event_date=YYYY-MM-DD", 400
 
-    # get active session info (from in-memory dict)
-    active_session = active_attendance.get(event_date)  # may be None
+    # get active session info (shared session store)
+    active_session = get_active_session(event_date)  # may be None
     now = datetime.datetime.now()
 
-    conn = sqlite3.connect(DATABASE)
-    cursor = conn.cursor()
-
-    # Fetch all students
-    cursor.execute("SELECT id, name FROM students")
-    students = cursor.fetchall()
-
-    # Fetch attendance records
-    cursor.execute("""
-        SELECT a.student_id, s.name, a.status
-        FROM attendance a
-        JOIN students s ON a.student_id = s.id
-        WHERE a.event_date = ?
-    """, (event_date,))
-    attendance_records = cursor.fetchall()
-
-    # Attendance summary
-    cursor.execute("""
-        SELECT COUNT(*),
-               SUM(CASE WHEN status='Present' THEN 1 ELSE 0 END),
-               SUM(CASE WHEN status='Absent' THEN 1 ELSE 0 END)
-        FROM attendance WHERE event_date = ?
-    """, (event_date,))
-    row = cursor.fetchone() or (0, 0, 0)
-    total, present, absent = row
-
-    conn.close()
-
-    attendance_summary = {
-        "total": total or 0,
-        "present": present or 0,
-        "absent": absent or 0,
-    }
+    # Students are picked through /api/students, not rendered into the page
+    # Attendance records + summary, as of this version
+    attendance_version = get_version(ATTENDANCE_VERSION)
+    attendance_records = get_attendance_records(event_date)
+    attendance_summary = get_attendance_summary(event_date)
 
     return render_template(
         "attendance.html",
-        students=students,
         event_date=event_date,
         attendance_records=attendance_records,
         attendance_summary=attendance_summary,
+        attendance_version=attendance_version,
         active_session=active_session,  # <-- added
         now=now                        # <-- added
     )
@@ -477,46 +567,155 @@ def mark_attendance(event_date):
     if not student_id or not status:
         return jsonify({"error": "Missing data"}), 400
 
-    conn = sqlite3.connect(DATABASE)
-    cursor = conn.cursor()
-
-    # This query relies on the UNIQUE constraint added in models.py
-    cursor.execute("""
-        INSERT INTO attendance (student_id, event_date, status)
-        VALUES (?, ?, ?)
-        ON CONFLICT(student_id, event_date) DO UPDATE SET status=excluded.status
-    """, (student_id, event_date, status))
-
-    conn.commit()
-
-    # Fetch updated records
-    cursor.execute("""
-        SELECT a.student_id, s.name, a.status
-        FROM attendance a
-        JOIN students s ON a.student_id = s.id
-        WHERE a.event_date = ?
-    """, (event_date,))
-    attendance_records = cursor.fetchall()
-
-    # Fetch updated summary
-    cursor.execute("""
-        SELECT COUNT(*), 
-               SUM(CASE WHEN status='Present' THEN 1 ELSE 0 END), 
-               SUM(CASE WHEN status='Absent' THEN 1 ELSE 0 END) 
-        FROM attendance WHERE event_date = ?
-    """, (event_date,))
-    total, present, absent = cursor.fetchone() or (0, 0, 0)
-
-    conn.close()
-
-    # Render partial table
-    table_html = render_template("attendance_table.html", attendance_records=attendance_records)
+    # Relies on the UNIQUE constraint added in models.py
+    with transaction() as conn:
+        version = upsert_attendance(conn, [(student_id, event_date, status, None, None)])
+
+    # Return only what changed; the page patches its table in place
+    return _mark_response(event_date, student_id, version)
+
+MAX_BULK_RECORDS = 1000
+ATTENDANCE_STATUSES = ("Present", "Absent")
+MAX_MARKED_BY_LENGTH = 64
+
+def _parse_timestamp(value):
+    """Accept ISO 8601 strings or epoch seconds; store naive local ISO text"""
+    if value is None or value == "":
+        return None
+    if isinstance(value, bool):
+        raise TypeError("timestamp must be a string or a number")
+    if isinstance(value, (int, float)):
+        ts = datetime.datetime.fromtimestamp(value)
+    else:
+        ts = datetime.datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+        if ts.tzinfo is not None:
+            ts = ts.astimezone().replace(tzinfo=None)
+    return ts.isoformat(timespec="seconds")
+
+def _parse_marked_by(value, default=None):
+    """The station label a scanner sent, or `default`; raises ValueError if it is not text"""
+    if value is None or value == "":
+        return default
+    if not isinstance(value, str):
+        raise ValueError("marked_by must be a string")
+    return value.strip()[:MAX_MARKED_BY_LENGTH] or default
+
+def _parse_student_id(value):
+    """A student id sent as an integer or a string of digits, else None"""
+    if isinstance(value, str) and value.isdigit():
+        return int(value)
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    return None
+
+@app.route("/attendance/bulk/<event_date>", methods=["POST"])
+def bulk_mark_attendance(event_date):
+    """
+    Apply a batch of check-ins in one transaction (e.g. a scanner flushing
+    its offline queue). Body: a JSON array, or {"records": [...]}, of
+    {"student_id" | "ieee_id", "status", "marked_by", "timestamp"}.
+    Returns one result per record, in order. Admin only, like marking
+    attendance from the attendance page.
+    """
+    if not session.get("admin"):
+        return jsonify({"error": "Unauthorized"}), 401
+    payload = request.get_json(silent=True)
+    records = payload.get("records") if isinstance(payload, dict) else payload
+    if not isinstance(records, list):
+        return jsonify({"error": "Expected a JSON array of records"}), 400
+    if len(records) > MAX_BULK_RECORDS:
+        return jsonify({"error": f"At most {MAX_BULK_RECORDS} records per request"}), 413
+
+    entries = [dict(r) if isinstance(r, dict) else {} for r in records]
+    # Scanners may send ids as strings; anything else matches no student
+    student_ids = [_parse_student_id(r.get("student_id")) for r in entries]
+    existing, by_ieee_id = resolve_student_ids(
+        student_ids=[i for i in student_ids if i is not None],
+        ieee_ids=[r["ieee_id"] for r in entries
+                  if r.get("student_id") is None and isinstance(r.get("ieee_id"), (str, int))]
+    )
+
+    results, rows = [], []
+    for index, record in enumerate(entries):
+        status = record.get("status", "Present")
+        if record.get("student_id") is not None:
+            student_id = student_ids[index] if student_ids[index] in existing else None
+        else:
+            student_id = by_ieee_id.get(str(record.get("ieee_id")))
+
+        if student_id is None:
+            results.append({"index": index, "ok": False, "error": "Unknown student"})
+            continue
+        if status not in ATTENDANCE_STATUSES:
+            results.append({"index": index, "ok": False, "error": "Invalid status"})
+            continue
+        try:
+            marked_at = _parse_timestamp(record.get("timestamp"))
+        except (TypeError, ValueError, OverflowError, OSError):
+            results.append({"index": index, "ok": False, "error": "Invalid timestamp"})
+            continue
+        try:
+            marked_by = _parse_marked_by(record.get("marked_by"))
+        except ValueError:
+            results.append({"index": index, "ok": False, "error": "Invalid marked_by"})
+            continue
+
+        rows.append((student_id, event_date, status, marked_by, marked_at))
+        results.append({"index": index, "ok": True, "student_id": student_id})
+
+    version = None
+    if rows:
+        with transaction() as conn:
+            version = upsert_attendance(conn, rows)
 
     return jsonify({
-        "summary": {"total": total, "present": present, "absent": absent},
-        "table_html": table_html
+        "applied": len(rows),
+        "failed": len(results) - len(rows),
+        "results": results,
+        "summary": get_attendance_summary(event_date),
+        "version": version
     })
 
+@app.route("/attendance/checkin/<event_date>", methods=["POST"])
+def qr_checkin(event_date):
+    """
+    Mark one scanned QR code. Body (JSON or form): "payload" as read from
+    the code, optional "status", "marked_by" and "timestamp". The student
+    is resolved from the in-memory IEEE ID index, so a scan costs one
+    dict lookup and one upsert. Admin only, like the bulk endpoint.
+    """
+    if not session.get("admin"):
+        return jsonify({"error": "Unauthorized"}), 401
+    data = request.get_json(silent=True) if request.is_json else request.form
+    if not isinstance(data, dict):
+        return jsonify({"error": "Expected a JSON object"}), 400
+    status = data.get("status", "Present")
+    if status not in ATTENDANCE_STATUSES:
+        return jsonify({"error": "Invalid status"}), 400
+    payload = data.get("payload")
+    if not isinstance(payload, str):
+        return jsonify({"error": "Expected a \"payload\" string"}), 400
+    try:
+        ieee_id = parse_qr_payload(payload)
+        marked_at = _parse_timestamp(data.get("timestamp"))
+    except InvalidPayload as exc:
+        return jsonify({"error": str(exc)}), 400
+    except (TypeError, ValueError, OverflowError, OSError):
+        return jsonify({"error": "Invalid timestamp"}), 400
+    try:
+        marked_by = _parse_marked_by(data.get("marked_by"), default="scanner")
+    except ValueError:
+        return jsonify({"error": "Invalid marked_by"}), 400
+
+    student = checkin_index.resolve(ieee_id)
+    if student is None:
+        return jsonify({"error": "Unknown student", "ieee_id": ieee_id}), 404
+    student_id, name = student
+
+    with transaction() as conn:
+        version = upsert_attendance(conn, [(student_id, event_date, status, marked_by, marked_at)])
+    return jsonify({"student_id": student_id, "name": name, "ieee_id": ieee_id, "status": status, "version": version})
+
 @app.route("/attendance/start", methods=["POST"])
 def start_attendance_session():
     event_date = request.form.get("event_date")
@@ -524,9 +723,8 @@ def start_attendance_session():
         flash("Event date is required", "danger")
         return redirect(url_for("admin_dashboard"))
 
-    # Session expires after 3 min
-    expiry_time = datetime.datetime.now() + datetime.timedelta(minutes=3)
-    active_attendance[event_date] = {"expires": expiry_time}
+    # Session expires after 3 min; the expiry scheduler closes it and writes the report
+    start_session(event_date, minutes=SESSION_MINUTES)
 
     flash(f"Attendance session started for {event_date} (valid 3 min)", "success")
     return redirect(url_for("attendance_page", event_date=event_date))
@@ -536,24 +734,26 @@ def student_self_mark(event_date):
     student_id = request.form.get("student_id")
 
     # ✅ check if session active
-    session_info = active_attendance.get(event_date)
-    if not session_info or session_info["expires"] < datetime.datetime.now():
+    session_info = get_active_session(event_date)
+    if not session_info:
         flash("❌ Attendance session expired or not active.", "danger")
         return redirect(url_for("attendance_page", event_date=event_date))
         return redirect(url_for("home"))
 
-    conn = sqlite3.connect(DATABASE)
-    cursor = conn.cursor()
-
-    # This query relies on the UNIQUE constraint added in models.py
-    cursor.execute("""
-        INSERT INTO attendance (student_id, event_date, status)
-        VALUES (?, ?, 'Present')
-        ON CONFLICT(student_id, event_date) DO UPDATE SET status='Present'
-    """, (student_id, event_date))
+    if not student_id or not student_id.isdigit():
+        flash("❌ Please select your name.", "danger")
+        return redirect(url_for("attendance_page", event_date=event_date))
+    if not checkin_index.has_student(int(student_id)):
+        flash("❌ Unknown student, please select your name again.", "danger")
+        return redirect(url_for("attendance_page", event_date=event_date))
 
-    conn.commit()
-    conn.close()
+    record = (int(student_id), event_date, "Present", "self", datetime.datetime.now().isoformat(timespec="seconds"))
+    if write_behind_enabled:
+        # Acknowledge now; the write-behind queue group-commits the burst
+        attendance_queue.submit(record)
+    else:
+        with transaction() as conn:
+            upsert_attendance(conn, [record])
 
     flash("✅ Attendance marked successfully!", "success")
     return redirect(url_for("home"))
@@ -566,18 +766,9 @@ def admin_manual_add(event_date):
     student_id = request.form.get("student_id")
     status = request.form.get("status", "Present")
 
-    conn = sqlite3.connect(DATABASE)
-    cursor = conn.cursor()
-
-    # This query relies on the UNIQUE constraint added in models.py
-    cursor.execute("""
-        INSERT INTO attendance (student_id, event_date, status)
-        VALUES (?, ?, ?)
-        ON CONFLICT(student_id, event_date) DO UPDATE SET status=excluded.status
-    """, (student_id, event_date, status))
-
-    conn.commit()
-    conn.close()
+    # Relies on the UNIQUE constraint added in models.py
+    with transaction() as conn:
+        upsert_attendance(conn, [(student_id, event_date, status, "admin", None)])
 
     flash("✅ Student added manually.", "success")
     return redirect(url_for("attendance_page", event_date=event_date))
@@ -585,33 +776,22 @@ def admin_manual_add(event_date):
 
 @app.route("/attendance/report/<event_date>")
 def attendance_report(event_date):
-    
-    conn = sqlite3.connect(DATABASE)
-    cursor = conn.cursor()
-    # SQL query now selects a.marked_by, which requires the updated models.py schema
-    cursor.execute("""
-        SELECT s.id, s.name, a.status, a.marked_by
-        FROM attendance a
-        JOIN students s ON a.student_id = s.id
-        WHERE a.event_date = ?
-    """, (event_date,))
-    records = cursor.fetchall()
-    conn.close()
-
-    # Placeholder for generate_attendance_pdf call
-    try:
-        from app.utils import generate_attendance_pdf
-        pdf_bytes = generate_attendance_pdf(records, event_date)
-    except ImportError:
-        flash("PDF generation utility function missing!", "danger")
-        return redirect(url_for("admin_dashboard"))
-    except NameError:
-        flash("PDF generation function not found!", "danger")
-        return redirect(url_for("admin_dashboard"))
-    
-    return send_file(
-        io.BytesIO(pdf_bytes),
-        mimetype="application/pdf",
-        as_attachment=True,
-        download_name=f"Attendance_{event_date}.pdf"
-    )
\ No newline at end of file
+    """Attendance report as PDF (default) or ?format=csv, streamed and cached per attendance state"""
+    fmt = request.args.get("format", "pdf").lower()
+    if fmt not in REPORT_FORMATS:
+        return jsonify({"error": "format must be csv or pdf"}), 400
+
+    download_name = f"Attendance_{event_date}.{fmt}"
+    version, path = cached_report(event_date, fmt)
+    etag = f"report-{event_date}-{version}-{fmt}"
+    if path is not None:
+        response = send_file(path, mimetype=REPORT_FORMATS[fmt], as_attachment=True,
+                             download_name=download_name, etag=etag, conditional=True, max_age=0)
+        response.headers["Cache-Control"] = "no-cache"
+        return response
+
+    response = Response(stream_with_context(stream_report(event_date, fmt, version)), mimetype=REPORT_FORMATS[fmt])
+    response.headers["Content-Disposition"] = f'attachment; filename="{download_name}"'
+    response.headers["Cache-Control"] = "no-cache"
+    response.set_etag(etag)
+    return response
@@ -0,0 +1,179 @@
+# app/search.py
+
+import base64
+import bisect
+import json
+
+from app.db import get_db
+from app.models import VersionChecked
+
+SEARCH_COLUMNS = ("name", "ieee_id", "domain")
+# The trigram tokenizer can only match queries of at least three characters
+MIN_TRIGRAM_LENGTH = 3
+PICKER_PAGE_SIZE = 20
+MAX_PICKER_PAGE_SIZE = 50
+
+
+def _fts_phrase(query: str) -> str:
+    """Quote user input as a single FTS5 phrase (a substring match under trigram)"""
+    return '"' + query.replace('"', '""') + '"'
+
+
+# ---------------- Student Search ----------------
+def search_students(query: str, limit: int = 20, offset: int = 0, columns=SEARCH_COLUMNS) -> list:
+    """
+    Ranked substring search over student name, IEEE ID and domain.
+    An exact IEEE ID match always comes first; the rest are ordered by
+    bm25 relevance. Returns at most `limit` dicts starting at `offset`.
+    """
+    query = (query or "").strip()
+    if not query:
+        return []
+
+    c = get_db().cursor()
+    exact = []
+    if "ieee_id" in columns:
+        c.execute("SELECT id, name, domain, ieee_id FROM students WHERE ieee_id = ?", (query,))
+        exact = [dict(r) for r in c.fetchall()]
+
+    # Exact matches are listed first on every page; page the ranked rest after them
+    results = exact[offset:offset + limit]
+    remaining = limit - len(results)
+    if remaining <= 0:
+        return results
+    rest_offset = max(0, offset - len(exact))
+    exclude = [r["id"] for r in exact]
+    not_exact = f"AND s.id NOT IN ({','.join('?' * len(exclude))})" if exclude else ""
+
+    if len(query) >= MIN_TRIGRAM_LENGTH:
+        match = "{" + " ".join(columns) + "} : " + _fts_phrase(query)
+        c.execute(f"""
+            SELECT s.id, s.name, s.domain, s.ieee_id
+            FROM students_fts f
+            JOIN students s ON s.id = f.rowid
+            WHERE students_fts MATCH ? {not_exact}
+            ORDER BY f.rank
+            LIMIT ? OFFSET ?
+        """, (match, *exclude, remaining, rest_offset))
+    else:
+        # Too short for trigrams: fall back to a bounded prefix match on name
+        prefix = query.replace("%", "").replace("_", "") + "%"
+        c.execute(f"""
+            SELECT s.id, s.name, s.domain, s.ieee_id
+            FROM students s
+            WHERE s.name LIKE ? {not_exact}
+            ORDER BY s.name
+            LIMIT ? OFFSET ?
+        """, (prefix, *exclude, remaining, rest_offset))
+
+    results.extend(dict(r) for r in c.fetchall())
+    return results
+
+
+# ---------------- Student Picker ----------------
+def encode_cursor(name, student_id) -> str:
+    """Opaque keyset cursor for the row a page ended on"""
+    return base64.urlsafe_b64encode(json.dumps([name, student_id]).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor):
+    """(name, id) from encode_cursor; raises ValueError for anything else"""
+    try:
+        name, student_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception as exc:
+        raise ValueError("Invalid cursor") from exc
+    if not isinstance(name, str) or not isinstance(student_id, int):
+        raise ValueError("Invalid cursor")
+    return name, student_id
+
+
+def list_students(query: str = "", domain: str = None, ieee_id: str = None, after: str = None,
+                  limit: int = PICKER_PAGE_SIZE):
+    """
+    One page of students ordered by (name, id), for pickers. `query`
+    matches name, IEEE ID or domain (substring via the trigram index,
+    name prefix when shorter than three characters); `domain` and
+    `ieee_id` filter exactly. Pages are keyset-paginated on
+    idx_students_name_id, so every page costs the same however deep it
+    is. Returns (rows, cursor for the next page or None).
+    """
+    sql = "SELECT s.id, s.name, s.ieee_id, s.domain FROM students s WHERE s.name IS NOT NULL"
+    params = []
+    query = (query or "").strip()
+    if len(query) >= MIN_TRIGRAM_LENGTH:
+        sql += " AND s.id IN (SELECT rowid FROM students_fts WHERE students_fts MATCH ?)"
+        params.append("{" + " ".join(SEARCH_COLUMNS) + "} : " + _fts_phrase(query))
+    elif query:
+        sql += " AND s.name LIKE ?"
+        params.append(query.replace("%", "").replace("_", "") + "%")
+    if domain:
+        sql += " AND s.domain = ? COLLATE NOCASE"
+        params.append(domain.strip())
+    if ieee_id:
+        sql += " AND s.ieee_id = ?"
+        params.append(str(ieee_id).strip())
+    if after:
+        sql += " AND (s.name, s.id) > (?, ?)"
+        params.extend(decode_cursor(after))
+
+    limit = min(max(int(limit), 1), MAX_PICKER_PAGE_SIZE)
+    # One extra row tells whether another page follows
+    rows = [dict(r) for r in get_db().execute(sql + " ORDER BY s.name, s.id LIMIT ?", (*params, limit + 1))]
+    cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        cursor = encode_cursor(rows[-1]["name"], rows[-1]["id"])
+    return rows, cursor
+
+
+# ---------------- Autocomplete ----------------
+class PrefixIndex(VersionChecked):
+    """
+    In-memory sorted prefix index over student names for autocomplete.
+    Each name is indexed under its full casefolded form and under every
+    later word, so "doe" finds "John Doe". Rebuilt when the roster
+    version moves.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._full = []   # sorted [(key, name)]
+        self._words = []  # sorted [(key, name)] for words after the first
+
+    def _build(self):
+        full, words = set(), set()
+        for (name,) in get_db().execute("SELECT name FROM students WHERE name IS NOT NULL"):
+            key = name.casefold()
+            full.add((key, name))
+            parts = key.split()
+            for i in range(1, len(parts)):
+                words.add((" ".join(parts[i:]), name))
+        self._full = sorted(full)
+        self._words = sorted(words)
+
+    @staticmethod
+    def _scan(entries, prefix, k, out, seen):
+        i = bisect.bisect_left(entries, (prefix,))
+        while i < len(entries) and len(out) < k:
+            key, name = entries[i]
+            if not key.startswith(prefix):
+                break
+            if name not in seen:
+                seen.add(name)
+                out.append(name)
+            i += 1
+
+    def suggest(self, prefix: str, k: int = 10) -> list:
+        """Up to k names starting with `prefix`, full-name matches first"""
+        prefix = (prefix or "").strip().casefold()
+        if not prefix:
+            return []
+        self.ensure_fresh()
+        full, words = self._full, self._words
+        out, seen = [], set()
+        self._scan(full, prefix, k, out, seen)
+        self._scan(words, prefix, k, out, seen)
+        return out
+
+
+name_index = PrefixIndex()
@@ -0,0 +1,190 @@
+# app/sessions.py
+
+import datetime
+import logging
+import os
+import threading
+import time
+
+from app.background import WorkerThread
+from app.db import get_db, transaction
+from app.models import SESSIONS_VERSION, bump_version, get_version
+from app.reports import iter_report_csv
+from app.writebehind import ENABLED as WRITE_BEHIND_ENABLED, FLUSH_INTERVAL_MS, MAX_FLUSH_RETRIES, attendance_queue
+
+SESSION_MINUTES = 3
+# Workers re-check the shared session version at most this often
+CACHE_TTL = 1.0
+# Upper bound on how long the scheduler sleeps, so sessions started by
+# another worker are still closed on time if that worker dies
+MAX_SCHEDULER_SLEEP = 30.0
+# Marks other workers acknowledged just before expiry may still sit in their
+# write-behind queues; the final report waits this long for those flushes
+# (every retry of a failing batch, plus a second of slack)
+REPORT_FLUSH_GRACE = float(os.environ.get(
+    "REPORT_FLUSH_GRACE_SECONDS", FLUSH_INTERVAL_MS * (MAX_FLUSH_RETRIES + 1) / 1000 + 1.0
+))
+
+REPORTS_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "attendance_reports")
+os.makedirs(REPORTS_FOLDER, exist_ok=True)
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_cache = {"version": None, "sessions": {}, "checked": 0.0}
+
+
+# ---------------- Session Store ----------------
+def _parse(value):
+    return datetime.datetime.fromisoformat(value) if value else None
+
+
+def _load_open_sessions():
+    rows = get_db().execute(
+        "SELECT event_date, started_at, expires_at FROM attendance_sessions WHERE closed_at IS NULL"
+    ).fetchall()
+    return {
+        r["event_date"]: {"event_date": r["event_date"], "started": _parse(r["started_at"]), "expires": _parse(r["expires_at"])}
+        for r in rows
+    }
+
+
+def open_sessions() -> dict:
+    """
+    {event_date: session} for sessions not yet closed, cached per worker
+    and refreshed when another worker starts or closes one.
+    """
+    with _lock:
+        now = time.monotonic()
+        if now - _cache["checked"] >= CACHE_TTL:
+            version = get_version(SESSIONS_VERSION)
+            if version != _cache["version"]:
+                _cache["sessions"] = _load_open_sessions()
+                _cache["version"] = version
+            _cache["checked"] = now
+        return _cache["sessions"]
+
+
+def _invalidate():
+    with _lock:
+        _cache["checked"] = 0.0
+
+
+def get_active_session(event_date):
+    """The open, unexpired session for an event, or None"""
+    info = open_sessions().get(event_date)
+    if info and info["expires"] > datetime.datetime.now():
+        return info
+    return None
+
+
+def latest_active_event_date():
+    now = datetime.datetime.now()
+    active = [d for d, info in open_sessions().items() if info["expires"] > now]
+    return max(active) if active else None
+
+
+def start_session(event_date, minutes=SESSION_MINUTES):
+    """Open (or re-open) the self-marking window for an event"""
+    now = datetime.datetime.now()
+    expires = now + datetime.timedelta(minutes=minutes)
+    with transaction() as conn:
+        conn.execute("""
+            INSERT INTO attendance_sessions (event_date, started_at, expires_at, closed_at)
+            VALUES (?, ?, ?, NULL)
+            ON CONFLICT(event_date) DO UPDATE SET
+                started_at = excluded.started_at,
+                expires_at = excluded.expires_at,
+                closed_at = NULL
+        """, (event_date, now.isoformat(timespec="seconds"), expires.isoformat(timespec="seconds")))
+        bump_version(conn, SESSIONS_VERSION)
+    _invalidate()
+    scheduler.wake()
+    return expires
+
+
+def close_session(event_date) -> bool:
+    """
+    Mark a session closed. Returns True only for the one caller (across all
+    workers) whose update actually closed it, so the report is written once.
+    """
+    with transaction() as conn:
+        cur = conn.execute(
+            "UPDATE attendance_sessions SET closed_at = ? WHERE event_date = ? AND closed_at IS NULL",
+            (datetime.datetime.now().isoformat(timespec="seconds"), event_date)
+        )
+        if cur.rowcount != 1:
+            return False
+        bump_version(conn, SESSIONS_VERSION)
+    _invalidate()
+    return True
+
+
+# ---------------- Reports ----------------
+def write_attendance_report(event_date):
+    """Write the event's attendance CSV into the reports folder"""
+    report_file = f"attendance_{event_date}.csv"
+    path = os.path.join(REPORTS_FOLDER, report_file)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+        f.writelines(iter_report_csv(event_date))
+    # Rename into place so the dashboard never lists a half-written report
+    os.replace(tmp_path, path)
+    return report_file
+
+
+def end_attendance(event_date):
+    """Save attendance report and close session after timeout"""
+    if not close_session(event_date):
+        return None
+    # Commit marks this worker acknowledged but has not flushed yet
+    attendance_queue.flush()
+    if WRITE_BEHIND_ENABLED:
+        # Self-marks are refused once the session has expired, so waiting
+        # out the other workers' flush interval is enough for theirs
+        time.sleep(REPORT_FLUSH_GRACE)
+    return write_attendance_report(event_date)
+
+
+# ---------------- Expiry Scheduler ----------------
+class ExpiryScheduler:
+    """
+    Per-worker thread that sleeps until the earliest open session expires,
+    then closes it and writes its report off the request path.
+    """
+
+    def __init__(self):
+        self._wake = threading.Event()
+        self._thread = WorkerThread(self._run, "attendance-session-expiry")
+
+    def ensure_started(self):
+        self._thread.ensure_started()
+
+    def wake(self):
+        self._wake.set()
+
+    def _next_expiry(self):
+        return get_db().execute(
+            "SELECT event_date, expires_at FROM attendance_sessions WHERE closed_at IS NULL ORDER BY expires_at LIMIT 1"
+        ).fetchone()
+
+    def _run(self):
+        while True:
+            sleep_for = MAX_SCHEDULER_SLEEP
+            try:
+                row = self._next_expiry()
+                while row and _parse(row["expires_at"]) <= datetime.datetime.now():
+                    report = end_attendance(row["event_date"])
+                    if report:
+                        logger.info("Closed attendance session %s, wrote %s", row["event_date"], report)
+                    row = self._next_expiry()
+                if row:
+                    remaining = (_parse(row["expires_at"]) - datetime.datetime.now()).total_seconds()
+                    sleep_for = min(max(remaining, 0.0), MAX_SCHEDULER_SLEEP)
+            except Exception:
+                logger.exception("Attendance session expiry check failed")
+            self._wake.wait(sleep_for)
+            self._wake.clear()
+
+
+scheduler = ExpiryScheduler()
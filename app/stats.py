@@ -0,0 +1,58 @@
+# app/stats.py
+
+from app.db import get_db
+from app.models import VersionChecked
+
+SOCIETIES = ["CASS", "COMSOC", "WIE", "Sensor", "CS"]
+
+
+def compute_stats() -> dict:
+    """Compute all dashboard counters in a single pass over students"""
+    society_sums = ", ".join("SUM(domain LIKE ?)" for _ in SOCIETIES)
+    row = get_db().execute(
+        f"""
+        SELECT COUNT(*),
+               SUM(category = 'Tech'),
+               SUM(category = 'Non-Tech'),
+               {society_sums}
+        FROM students
+        """,
+        [f"%{soc}%" for soc in SOCIETIES]
+    ).fetchone()
+
+    total_students, tech, non_tech, *society_counts = [v or 0 for v in row]
+    return {
+        "total_students": total_students,
+        "total_id_cards": total_students,
+        "tech": tech,
+        "non_tech": non_tech,
+        **{soc.lower(): count for soc, count in zip(SOCIETIES, society_counts)}
+    }
+
+
+class StatsCache(VersionChecked):
+    """Dashboard counters, recomputed only when the roster version moves"""
+
+    def __init__(self):
+        super().__init__()
+        self.stats = None
+
+    def _build(self):
+        self.stats = compute_stats()
+
+    def get(self):
+        version = self.ensure_fresh()
+        return version, self.stats
+
+
+_stats = StatsCache()
+
+
+def get_cached_stats():
+    """Return (version, stats) from this worker's cache"""
+    return _stats.get()
+
+
+def invalidate_stats():
+    """Force the next read to check the roster version"""
+    _stats.invalidate()
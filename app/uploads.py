@@ -0,0 +1,111 @@
+# app/uploads.py
+
+import datetime
+import hashlib
+import os
+import threading
+
+from app.db import get_db, transaction
+from app.models import ROSTER_VERSION, get_version
+
+CHUNK_BYTES = 64 * 1024
+
+
+# ---------------- Upload Store ----------------
+def save_upload(file, folder):
+    """
+    Stream an uploaded file to disk while hashing it. Files are stored
+    content-addressed as <sha256>.csv, so identical uploads share one copy
+    and a later upload with the same name never overwrites an earlier one.
+    Returns (sha256, size, path).
+    """
+    os.makedirs(folder, exist_ok=True)
+    tmp_path = os.path.join(folder, f".upload.{os.getpid()}.{threading.get_ident()}.tmp")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(tmp_path, "wb") as f:
+            for chunk in iter(lambda: file.stream.read(CHUNK_BYTES), b""):
+                digest.update(chunk)
+                f.write(chunk)
+                size += len(chunk)
+        sha256 = digest.hexdigest()
+        path = os.path.join(folder, f"{sha256}.csv")
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return sha256, size, path
+
+
+def find_duplicate_upload(sha256, mode="upsert"):
+    """
+    The previous upload this import would merely repeat: one with the same
+    content whose import is still pending, or the last one imported if it
+    has the same content and no import has changed the roster since.
+    An upsert repeats any import of the same content; a replace only
+    repeats another replace, since it also removes students missing from
+    the file. Returns its row or None.
+    """
+    # Previous imports an import in `mode` would repeat
+    modes = ("upsert", "replace") if mode == "upsert" else ("replace",)
+    placeholders = ",".join("?" * len(modes))
+    conn = get_db()
+    pending = conn.execute(f"""
+        SELECT u.id, u.filename, u.uploaded_at FROM uploads u
+        JOIN import_jobs j ON j.id = u.job_id
+        WHERE u.sha256 = ? AND j.status IN ('queued', 'running') AND j.mode IN ({placeholders})
+        LIMIT 1
+    """, (sha256, *modes)).fetchone()
+    if pending:
+        return pending
+    row = conn.execute("""
+        SELECT u.id, u.filename, u.uploaded_at, u.roster_version, u.sha256, j.mode FROM uploads u
+        JOIN import_jobs j ON j.id = u.job_id
+        WHERE u.roster_version IS NOT NULL
+        ORDER BY u.id DESC LIMIT 1
+    """).fetchone()
+    if (row and row["sha256"] == sha256 and row["mode"] in modes
+            and row["roster_version"] == get_version(ROSTER_VERSION)):
+        return row
+    return None
+
+
+def record_upload(filename, sha256, size, uploaded_by="Admin", job_id=None, duplicate_of=None) -> int:
+    with transaction() as conn:
+        cur = conn.execute("""
+            INSERT INTO uploads (filename, sha256, size, uploaded_at, uploaded_by, job_id, duplicate_of)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (filename, sha256, size, datetime.datetime.now().isoformat(sep=" ", timespec="seconds"),
+              uploaded_by, job_id, duplicate_of))
+        return cur.lastrowid
+
+
+def mark_upload_imported(job_id, row_count, duration):
+    """Record an upload's import result and the roster state it produced"""
+    with transaction() as conn:
+        conn.execute(
+            "UPDATE uploads SET row_count = ?, duration = ?, roster_version = ? WHERE job_id = ?",
+            (row_count, duration, get_version(ROSTER_VERSION, conn), job_id)
+        )
+
+
+def recent_uploads(limit=5) -> list:
+    """Newest uploads with their import status, served by idx_uploads_uploaded_at"""
+    rows = get_db().execute("""
+        SELECT u.id, u.filename, u.uploaded_at, u.uploaded_by, u.size, u.row_count, u.duration,
+               u.duplicate_of, j.status AS job_status
+        FROM uploads u LEFT JOIN import_jobs j ON j.id = u.job_id
+        ORDER BY u.uploaded_at DESC, u.id DESC
+        LIMIT ?
+    """, (limit,)).fetchall()
+    return [{
+        "id": r["id"],
+        "filename": r["filename"],
+        "uploaded_on": r["uploaded_at"],
+        "uploaded_by": r["uploaded_by"],
+        "size": r["size"],
+        "row_count": r["row_count"],
+        "duration": r["duration"],
+        "status": "skipped (duplicate)" if r["duplicate_of"] else (r["job_status"] or "unknown"),
+    } for r in rows]
@@ -1,19 +1,32 @@
 # app/utils.py
 
-import qrcode
 import io
 import os
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.utils import ImageReader
+
+from app.checkin import encode_qr_payload
+from app.metrics import timed
+from card_sheets import render_idcard_sheet_pdf
+
+# qrcode and reportlab (with PIL behind them) are imported inside the
+# functions that need them, so booting a worker does not pay for them
 
 # ---------------- QR Code Generator ----------------
+@timed("render_duration_seconds", kind="qr_code")
 def generate_qr_code(name: str, ieee_id: str) -> bytes:
     """
-    Generate a QR code as bytes using name and IEEE ID.
+    Generate a QR code as bytes for a student's signed check-in payload.
+    The payload carries only the IEEE ID; `name` is kept for callers.
     Returns PNG bytes suitable for storing in SQLite BLOB.
     """
-    data = f"Name: {name}, IEEE ID: {ieee_id}"
+    return render_qr_png(encode_qr_payload(ieee_id))
+
+
+def render_qr_png(data: str) -> bytes:
+    """
+    PNG bytes of a QR code for `data`, without the metrics timer, for
+    process pool children: it touches no shared state.
+    """
+    import qrcode
 
     qr = qrcode.QRCode(
         version=1,
@@ -32,19 +45,23 @@ def generate_qr_code(name: str, ieee_id: str) -> bytes:
 
 
 # ---------------- ID Card PDF Generator ----------------
-def generate_idcard_pdf(name: str, ieee_id: str, qr_bytes: bytes = None, output_path: str = None):
+@timed("render_duration_seconds", kind="idcard_pdf")
+def generate_idcard_pdf(name: str, ieee_id: str, qr_bytes: bytes = None, output_path=None):
     """
     Generate a simple ID card PDF with name, ieee_id, and QR code.
     If qr_bytes is not provided, it will generate a new QR code.
+    output_path may be a file path or a binary file object; if omitted the
+    PDF is rendered in memory and its bytes are returned.
     """
-    # Default path
-    if output_path is None:
-        output_path = f"idcard_{ieee_id}.pdf"
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.utils import ImageReader
+    from reportlab.pdfgen import canvas
 
     if qr_bytes is None:
         qr_bytes = generate_qr_code(name, ieee_id)
 
-    c = canvas.Canvas(output_path, pagesize=A4)
+    buf = io.BytesIO() if output_path is None else None
+    c = canvas.Canvas(buf if buf is not None else output_path, pagesize=A4)
     width, height = A4
 
     # Title
@@ -63,4 +80,78 @@ def generate_idcard_pdf(name: str, ieee_id: str, qr_bytes: bytes = None, output_
     # Save PDF
     c.save()
 
-    return output_path
+    return buf.getvalue() if buf is not None else output_path
+
+
+# ---------------- N-up ID Card Sheet Generator ----------------
+@timed("render_duration_seconds", kind="idcard_sheet_pdf")
+def generate_idcard_sheet_pdf(cards, per_page: int = 8, output_path=None):
+    """
+    Lay out ID cards N-up on A4 pages for printing.
+    `cards` is an iterable of dicts with "name", "ieee_id", "qr_bytes" and
+    optionally "domain"; it is consumed lazily, one card at a time.
+    output_path may be a file path or a binary file object; if omitted the
+    PDF bytes are returned. Returns (output, page_count).
+    """
+    return render_idcard_sheet_pdf(cards, per_page, output_path)
+
+
+# ---------------- Attendance Report PDF Generator ----------------
+REPORT_ROWS_PER_PAGE = 40
+
+
+@timed("render_duration_seconds", kind="attendance_pdf")
+def generate_attendance_pdf(records, event_date: str, output_path=None):
+    """
+    Paginated attendance report for one event. `records` is an iterable of
+    rows with student_id, name, status and marked_by, consumed one at a
+    time; the header is repeated on every page and a summary closes it.
+    output_path may be a file path or a binary file object; if omitted the
+    PDF bytes are returned.
+    """
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+
+    buf = io.BytesIO() if output_path is None else None
+    c = canvas.Canvas(buf if buf is not None else output_path, pagesize=A4)
+    width, height = A4
+    margin = 50
+    row_h = (height - 2 * margin - 90) / REPORT_ROWS_PER_PAGE
+    columns = ((margin, "Student ID"), (margin + 80, "Name"), (margin + 330, "Status"), (margin + 410, "Marked By"))
+
+    def start_page(page):
+        c.setFont("Helvetica-Bold", 16)
+        c.drawCentredString(width / 2, height - margin, f"Attendance Report - {event_date}")
+        c.setFont("Helvetica-Bold", 10)
+        y = height - margin - 40
+        for x, title in columns:
+            c.drawString(x, y, title)
+        c.line(margin, y - 4, width - margin, y - 4)
+        c.setFont("Helvetica", 8)
+        c.drawRightString(width - margin, margin / 2, f"Page {page}")
+        c.setFont("Helvetica", 10)
+        return y - row_h
+
+    counts = {"Present": 0, "Absent": 0}
+    total = 0
+    page = 1
+    y = start_page(page)
+    for record in records:
+        if total and total % REPORT_ROWS_PER_PAGE == 0:
+            c.showPage()
+            page += 1
+            y = start_page(page)
+        values = (record["student_id"], record["name"], record["status"], record["marked_by"] or "")
+        for (x, _), value in zip(columns, values):
+            c.drawString(x, y, str(value)[:40])
+        y -= row_h
+        total += 1
+        counts[record["status"]] = counts.get(record["status"], 0) + 1
+
+    y -= row_h
+    c.setFont("Helvetica-Bold", 10)
+    c.drawString(margin, y, f"Total: {total}    Present: {counts['Present']}    Absent: {counts['Absent']}")
+    c.showPage()
+    c.save()
+
+    return buf.getvalue() if buf is not None else output_path
@@ -0,0 +1,142 @@
+# app/writebehind.py
+
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+from app.background import WorkerThread
+from app.db import transaction
+from app.models import upsert_attendance
+
+FLUSH_INTERVAL_MS = int(os.environ.get("WRITE_BEHIND_FLUSH_MS", 50))
+MAX_BATCH = int(os.environ.get("WRITE_BEHIND_MAX_BATCH", 200))
+ENABLED = os.environ.get("WRITE_BEHIND", "1") != "0"
+# Consecutive failed flushes before the batch is committed record by record
+# and the records that still fail are dropped (and logged)
+MAX_FLUSH_RETRIES = int(os.environ.get("WRITE_BEHIND_MAX_RETRIES", 3))
+
+logger = logging.getLogger(__name__)
+
+
+# ---------------- Group Commit Queue ----------------
+class GroupCommitQueue:
+    """
+    Write-behind buffer for attendance marks. Requests enqueue and return
+    at once; a background thread commits everything queued so far in one
+    transaction every FLUSH_INTERVAL_MS, or sooner once MAX_BATCH records
+    are waiting. One commit (and one fsync) then covers a whole burst.
+    """
+
+    def __init__(self, flush_interval_ms=FLUSH_INTERVAL_MS, max_batch=MAX_BATCH):
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_batch = max_batch
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._flusher = WorkerThread(self._run, "attendance-write-behind")
+        self._closed = False
+        self._failures = 0
+        self._stats = {
+            "flushes": 0,
+            "records_flushed": 0,
+            "flush_errors": 0,
+            "records_dropped": 0,
+            "last_flush_ms": 0.0,
+            "max_flush_ms": 0.0,
+            "total_flush_ms": 0.0,
+            "last_batch_size": 0,
+        }
+
+    def submit(self, record):
+        """Queue one (student_id, event_date, status, marked_by, marked_at) record"""
+        with self._cond:
+            if self._flusher.ensure_started():
+                # Marks inherited from the parent process are its to commit
+                self._pending.clear()
+            self._pending.append(record)
+            if len(self._pending) >= self.max_batch:
+                self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: len(self._pending) >= self.max_batch or self._closed,
+                                    timeout=self.flush_interval)
+                closed = self._closed
+            self.flush()
+            if closed:
+                return
+
+    def flush(self):
+        """Commit everything queued so far; safe to call from any thread"""
+        with self._flush_lock:
+            with self._cond:
+                batch = list(self._pending)
+                self._pending.clear()
+            if not batch:
+                return 0
+
+            started = time.perf_counter()
+            try:
+                with transaction() as conn:
+                    upsert_attendance(conn, batch)
+            except Exception:
+                self._stats["flush_errors"] += 1
+                self._failures += 1
+                logger.exception("Write-behind flush of %d attendance marks failed (attempt %d)",
+                                 len(batch), self._failures)
+                if self._failures < MAX_FLUSH_RETRIES:
+                    # Put the batch back in front so the next flush retries it
+                    with self._cond:
+                        self._pending.extendleft(reversed(batch))
+                    return 0
+                # Stop one bad record from blocking every later mark
+                self._failures = 0
+                return self._flush_one_by_one(batch)
+
+            self._failures = 0
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self._stats["flushes"] += 1
+            self._stats["records_flushed"] += len(batch)
+            self._stats["last_flush_ms"] = elapsed_ms
+            self._stats["max_flush_ms"] = max(self._stats["max_flush_ms"], elapsed_ms)
+            self._stats["total_flush_ms"] += elapsed_ms
+            self._stats["last_batch_size"] = len(batch)
+            return len(batch)
+
+    def _flush_one_by_one(self, batch):
+        written = 0
+        for record in batch:
+            try:
+                with transaction() as conn:
+                    upsert_attendance(conn, [record])
+                written += 1
+            except Exception:
+                self._stats["records_dropped"] += 1
+                logger.exception("Dropping attendance mark %r after %d failed flushes", record, MAX_FLUSH_RETRIES)
+        self._stats["records_flushed"] += written
+        return written
+
+    def close(self):
+        """Flush pending marks and stop the flusher (called on shutdown)"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        if self._flusher.running:
+            self.flush()
+
+    def stats(self) -> dict:
+        stats = dict(self._stats)
+        stats["depth"] = len(self._pending)
+        stats["avg_flush_ms"] = stats["total_flush_ms"] / stats["flushes"] if stats["flushes"] else 0.0
+        stats["flush_interval_ms"] = self.flush_interval * 1000
+        stats["max_batch"] = self.max_batch
+        stats["enabled"] = ENABLED
+        return stats
+
+
+attendance_queue = GroupCommitQueue()
+atexit.register(attendance_queue.close)
@@ -0,0 +1,382 @@
+# bench/load.py
+"""
+Load benchmark for the hot routes. Seeds a throwaway database with a
+synthetic roster and attendance history, then drives the routes through
+the Flask test client and/or a local gunicorn, and prints p50/p99
+latency and throughput as JSON.
+
+    python bench/load.py --students 1000,10000 --target both --output bench_output.json
+
+The real instance/students.db is never touched: everything runs against
+--db (default instance/bench.db) with its own upload and cache folders.
+"""
+
+import argparse
+import datetime
+import http.client
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DOMAINS = ("AI", "ML", "Web", "IoT", "Robotics", "Power", "Signal Processing")
+CATEGORIES = ("Student", "Professional")
+FIRST_NAMES = ("Alice", "Bob", "Chandra", "Dev", "Esha", "Farhan", "Gita", "Hari", "Isha", "Jay",
+               "Kavya", "Liam", "Maya", "Nikhil", "Omar", "Priya", "Rahul", "Sara", "Tanvi", "Vikram")
+LAST_NAMES = ("Sharma", "Das", "Roy", "Khan", "Patel", "Iyer", "Singh", "Bose", "Nair", "Gupta",
+              "Mehta", "Reddy", "Sen", "Joshi", "Kapoor", "Ghosh", "Rao", "Verma", "Paul", "Dutta")
+CSV_HEADER = "Name,Domain,Joining Date,Category,IEEE ID\n"
+BOUNDARY = "benchboundary7MA4YWxkTrZu0gW"
+SESSION_EVENT = "2099-01-01"
+MARK_EVENT = "2099-01-02"
+
+
+# ---------------- Environment ----------------
+def configure_env(args):
+    """Point the app at throwaway paths; must run before `app` is imported"""
+    work = os.path.abspath(args.workdir)
+    os.environ["STUDENTS_DB"] = os.path.abspath(args.db)
+    os.environ["CARD_CACHE_DIR"] = os.path.join(work, "card_cache")
+    os.environ["REPORT_CACHE_DIR"] = os.path.join(work, "report_cache")
+    os.environ["UPLOAD_FOLDER"] = os.path.join(work, "uploads")
+    os.environ["METRICS_DIR"] = os.path.join(work, "metrics")
+    os.makedirs(os.environ["UPLOAD_FOLDER"], exist_ok=True)
+
+
+def reset_workdir(args):
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(args.db + suffix):
+            os.remove(args.db + suffix)
+    shutil.rmtree(args.workdir, ignore_errors=True)
+    os.makedirs(os.path.join(args.workdir, "uploads"), exist_ok=True)
+
+
+# ---------------- Synthetic Data ----------------
+def synthetic_students(count, rng, variant=0):
+    """Roster rows as written by an upload; `variant` edits ~5% of them"""
+    for i in range(count):
+        domain = DOMAINS[i % len(DOMAINS)]
+        if variant and rng.random() < 0.05:
+            domain = f"{domain} {variant}"
+        yield {
+            "Name": f"{FIRST_NAMES[i % 20]} {LAST_NAMES[(i // 20) % 20]} {i}",
+            "Domain": domain,
+            "Joining Date": (datetime.date(2020, 1, 1) + datetime.timedelta(days=i % 1500)).isoformat(),
+            "Category": CATEGORIES[i % 2],
+            "IEEE ID": str(90000000 + i),
+        }
+
+
+def roster_csv(count, rng, variant):
+    lines = [CSV_HEADER]
+    for s in synthetic_students(count, rng, variant):
+        lines.append(f"{s['Name']},{s['Domain']},{s['Joining Date']},{s['Category']},{s['IEEE ID']}\n")
+    return "".join(lines).encode("utf-8")
+
+
+def seed(count, events, rng):
+    """Fresh schema, `count` students and `events` past events of attendance"""
+    from app.db import transaction
+    from app.models import clear_and_insert_students, init_db, upsert_attendance
+    from app.sessions import start_session
+
+    init_db()
+    students = list(synthetic_students(count, rng))
+    for s in students:
+        s["QR"] = None
+    clear_and_insert_students(students)
+
+    base = datetime.date(2024, 1, 1)
+    for e in range(events):
+        event_date = (base + datetime.timedelta(days=7 * e)).isoformat()
+        records = [
+            (sid, event_date, "Present" if rng.random() < 0.8 else "Absent", "admin", None)
+            for sid in range(1, count + 1) if rng.random() < 0.9
+        ]
+        with transaction() as conn:
+            upsert_attendance(conn, records)
+
+    # Self-marking needs an open session for the whole run
+    start_session(SESSION_EVENT, minutes=24 * 60)
+
+
+# ---------------- Scenarios ----------------
+def _form(fields):
+    from urllib.parse import urlencode
+    return urlencode(fields).encode(), {"Content-Type": "application/x-www-form-urlencoded"}
+
+
+def _multipart(fields, file_field, filename, payload):
+    parts = []
+    for key, value in fields.items():
+        parts.append(f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{key}"\r\n\r\n{value}\r\n'.encode())
+    parts.append(
+        f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{file_field}"; filename="{filename}"\r\n'
+        f"Content-Type: text/csv\r\n\r\n".encode() + payload + b"\r\n"
+    )
+    parts.append(f"--{BOUNDARY}--\r\n".encode())
+    return b"".join(parts), {"Content-Type": f"multipart/form-data; boundary={BOUNDARY}"}
+
+
+def build_scenarios(count, rng):
+    """name -> callable(i) returning (method, path, body, headers)"""
+
+    def student_id():
+        return rng.randint(1, count)
+
+    def mark(i):
+        body, headers = _form({"student_id": student_id(), "status": rng.choice(("Present", "Absent"))})
+        return "POST", f"/attendance/mark/{MARK_EVENT}", body, headers
+
+    def self_mark(i):
+        body, headers = _form({"student_id": student_id()})
+        return "POST", f"/attendance/self_mark/{SESSION_EVENT}", body, headers
+
+    def search_ieee(i):
+        body, headers = _form({"ieee_id": 90000000 + student_id() - 1, "captcha_answer": 2})
+        return "POST", "/search", body, headers
+
+    def search_name(i):
+        n = student_id() - 1
+        body, headers = _form({"name": f"{FIRST_NAMES[n % 20]} {LAST_NAMES[(n // 20) % 20]} {n}", "captcha_answer": 2})
+        return "POST", "/search", body, headers
+
+    def stats(i):
+        return "GET", "/admin/get_stats", None, {}
+
+    # A small pool of students so cold renders and cache hits both show up
+    download_pool = [student_id() for _ in range(50)]
+
+    def download(i):
+        return "GET", f"/download/{rng.choice(download_pool)}", None, {}
+
+    def csv_import(i):
+        body, headers = _multipart({"import_mode": "upsert"}, "csv_file", "bench_roster.csv",
+                                   roster_csv(count, rng, variant=i + 1))
+        return "POST", "/admin/dashboard", body, headers
+
+    return {
+        "mark_attendance": mark,
+        "student_self_mark": self_mark,
+        "search_ieee_id": search_ieee,
+        "search_name": search_name,
+        "get_stats": stats,
+        "user_download": download,
+        "csv_import": csv_import,
+    }
+
+
+def session_cookie():
+    """Signed Flask session with admin rights and a fixed 1 + 1 captcha"""
+    from app import app
+    serializer = app.session_interface.get_signing_serializer(app)
+    value = serializer.dumps({"admin": True, "captcha_num1": 1, "captcha_num2": 1})
+    return f"{app.config['SESSION_COOKIE_NAME']}={value}"
+
+
+# ---------------- Transports ----------------
+class TestClientTransport:
+    name = "test_client"
+
+    def __init__(self, cookie):
+        from app import app
+        self.app = app
+        self.cookie = cookie
+        self._local = threading.local()
+
+    def request(self, method, path, body, headers):
+        client = getattr(self._local, "client", None)
+        if client is None:
+            # No cookie jar: every request carries the same fixed session
+            client = self._local.client = self.app.test_client(use_cookies=False)
+        response = client.open(path, method=method, data=body, headers={**headers, "Cookie": self.cookie})
+        response.close()
+        return response.status_code
+
+
+class GunicornTransport:
+    name = "gunicorn"
+
+    def __init__(self, cookie, workers, threads):
+        self.cookie = cookie
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            self.port = s.getsockname()[1]
+        env = dict(os.environ, PORT=str(self.port), WEB_CONCURRENCY=str(workers), GUNICORN_THREADS=str(threads))
+        self.proc = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "run:app", "--log-level", "warning"],
+            cwd=ROOT, env=env,
+        )
+        self._local = threading.local()
+        self._wait_ready()
+
+    def _wait_ready(self, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.proc.poll() is not None:
+                sys.exit("gunicorn exited during startup")
+            try:
+                with socket.create_connection(("127.0.0.1", self.port), timeout=0.5):
+                    return
+            except OSError:
+                time.sleep(0.2)
+        self.close()
+        sys.exit("gunicorn did not start in time")
+
+    def request(self, method, path, body, headers):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=60)
+        try:
+            conn.request(method, path, body=body, headers={**headers, "Cookie": self.cookie})
+            response = conn.getresponse()
+            response.read()
+            return response.status
+        except (http.client.HTTPException, OSError):
+            conn.close()
+            self._local.conn = None
+            return 599
+
+    def close(self):
+        self.proc.terminate()
+        try:
+            self.proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+
+
+# ---------------- Runner ----------------
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(pct / 100 * len(sorted_values))) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def run_scenario(transport, make_request, requests, concurrency):
+    # Build requests up front so payload generation is not timed
+    prepared = [make_request(i) for i in range(requests)]
+    latencies = [0.0] * requests
+    statuses = [0] * requests
+
+    def worker(i):
+        method, path, body, headers = prepared[i]
+        started = time.perf_counter()
+        statuses[i] = transport.request(method, path, body, headers)
+        latencies[i] = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    if concurrency <= 1:
+        for i in range(requests):
+            worker(i)
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(worker, range(requests)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": sum(1 for s in statuses if s >= 500),
+        "status_codes": {str(code): statuses.count(code) for code in sorted(set(statuses))},
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p90_ms": round(percentile(latencies, 90), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "mean_ms": round(sum(latencies) / requests, 3),
+        "max_ms": round(latencies[-1], 3),
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(requests / elapsed, 2) if elapsed > 0 else 0.0,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", default="1000,10000",
+                        help="comma-separated roster sizes to benchmark (e.g. 1000,10000,100000)")
+    parser.add_argument("--events", type=int, default=10, help="past events of attendance history to seed")
+    parser.add_argument("--requests", type=int, default=500, help="requests per scenario")
+    parser.add_argument("--import-requests", type=int, default=3, help="requests for the CSV import scenario")
+    parser.add_argument("--concurrency", type=int, default=8, help="client threads")
+    parser.add_argument("--target", choices=("client", "gunicorn", "both"), default="client")
+    parser.add_argument("--gunicorn-workers", type=int, default=2)
+    parser.add_argument("--gunicorn-threads", type=int, default=16)
+    parser.add_argument("--scenarios", help="comma-separated subset of scenarios to run")
+    parser.add_argument("--db", default=os.path.join(ROOT, "instance", "bench.db"))
+    parser.add_argument("--workdir", default=os.path.join(ROOT, "instance", "bench"))
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="also write the JSON results to this file")
+    args = parser.parse_args()
+
+    if os.path.abspath(args.db) == os.path.abspath(os.path.join(ROOT, "instance", "students.db")):
+        sys.exit("refusing to overwrite the real database; pass a different --db")
+
+    configure_env(args)
+    sys.path.insert(0, ROOT)
+    targets = ("client", "gunicorn") if args.target == "both" else (args.target,)
+
+    results = []
+    for count in (int(n) for n in args.students.split(",")):
+        reset_workdir(args)
+        rng = random.Random(args.seed)
+        seed_started = time.perf_counter()
+        seed(count, args.events, rng)
+        print(f"seeded {count} students x {args.events} events in {time.perf_counter() - seed_started:.1f}s",
+              file=sys.stderr)
+
+        cookie = session_cookie()
+        for target in targets:
+            transport = (TestClientTransport(cookie) if target == "client"
+                         else GunicornTransport(cookie, args.gunicorn_workers, args.gunicorn_threads))
+            try:
+                scenarios = build_scenarios(count, random.Random(args.seed))
+                selected = args.scenarios.split(",") if args.scenarios else list(scenarios)
+                for name in selected:
+                    is_import = name == "csv_import"
+                    result = run_scenario(
+                        transport, scenarios[name],
+                        args.import_requests if is_import else args.requests,
+                        1 if is_import else args.concurrency,
+                    )
+                    result.update({"target": target, "students": count, "scenario": name})
+                    results.append(result)
+                    print(f"{target:>11} {count:>7} {name:<18} p50 {result['p50_ms']:8.2f} ms  "
+                          f"p99 {result['p99_ms']:8.2f} ms  {result['throughput_rps']:8.1f} req/s  "
+                          f"errors {result['errors']}", file=sys.stderr)
+            finally:
+                if target == "gunicorn":
+                    transport.close()
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("db", "workdir", "output")},
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# bench/startup.py
+"""
+Cold-start benchmark: imports the app in fresh interpreters with
+`-X importtime` and reports wall time plus the costliest modules.
+
+    python bench/startup.py [--runs 5] [--top 15] [--module run] [--json]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_importtime(stderr: str) -> dict:
+    """{module: (self_us, cumulative_us)} from `-X importtime` output"""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return modules
+
+
+def run_once(module: str):
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    started = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    elapsed = time.perf_counter() - started
+    if proc.returncode != 0:
+        sys.exit(proc.stderr)
+    return elapsed, parse_importtime(proc.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--module", default="run", help="module to import (default: run, as gunicorn does)")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    # First run warms the bytecode and OS file caches; it is not counted
+    run_once(args.module)
+    walls, per_module = [], {}
+    for _ in range(args.runs):
+        elapsed, modules = run_once(args.module)
+        walls.append(elapsed)
+        for name, (self_us, cumulative_us) in modules.items():
+            per_module.setdefault(name, []).append((self_us, cumulative_us))
+
+    medians = {
+        name: (statistics.median(s for s, _ in samples), statistics.median(c for _, c in samples))
+        for name, samples in per_module.items()
+    }
+    top = sorted(medians.items(), key=lambda item: item[1][1], reverse=True)[:args.top]
+    app_modules = {name: cumulative for name, (_, cumulative) in medians.items()
+                   if name == "app" or name.startswith("app.")}
+    result = {
+        "module": args.module,
+        "runs": args.runs,
+        "wall_ms_median": statistics.median(walls) * 1000,
+        "wall_ms_min": min(walls) * 1000,
+        "modules_imported": len(medians),
+        "heavy_modules_loaded": sorted(m for m in ("pandas", "numpy", "qrcode", "reportlab", "PIL") if m in medians),
+        "top_cumulative_ms": {name: cumulative / 1000 for name, (_, cumulative) in top},
+        "app_cumulative_ms": {name: cumulative / 1000 for name, cumulative in sorted(app_modules.items())},
+    }
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+
+    print(f"import {args.module}: median {result['wall_ms_median']:.1f} ms, "
+          f"min {result['wall_ms_min']:.1f} ms over {args.runs} runs, {len(medians)} modules")
+    print(f"heavy modules loaded: {', '.join(result['heavy_modules_loaded']) or 'none'}")
+    print(f"\n{'cumulative ms':>14}  {'self ms':>9}  module")
+    for name, (self_us, cumulative_us) in top:
+        print(f"{cumulative_us / 1000:14.1f}  {self_us / 1000:9.1f}  {name}")
+
+
+if __name__ == "__main__":
+    main()
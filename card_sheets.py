@@ -0,0 +1,187 @@
+# card_sheets.py
+#
+# N-up ID card sheet rendering for the export process pool. This module
+# deliberately lives outside the app package and imports nothing from it:
+# spawned pool children import only what the task needs, not the Flask
+# app, its blueprints and the database layer.
+
+import io
+import re
+import time
+
+
+# ---------------- N-up ID Card Sheets ----------------
+def _sheet_grid(per_page: int):
+    """(columns, rows) for laying out `per_page` cards on one A4 page"""
+    cols = 1 if per_page == 1 else 2
+    rows = -(-per_page // cols)
+    return cols, rows
+
+
+def render_idcard_sheet_pdf(cards, per_page: int = 8, output_path=None):
+    """
+    Lay out ID cards N-up on A4 pages, without the metrics timer (see
+    app.utils.generate_idcard_sheet_pdf). Returns (output, page_count).
+    """
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.utils import ImageReader
+    from reportlab.pdfgen import canvas
+
+    buf = io.BytesIO() if output_path is None else None
+    c = canvas.Canvas(buf if buf is not None else output_path, pagesize=A4)
+    width, height = A4
+    margin = 28
+    cols, rows = _sheet_grid(per_page)
+    cell_w = (width - 2 * margin) / cols
+    cell_h = (height - 2 * margin) / rows
+
+    pages = 0
+    slot = 0
+    for card in cards:
+        if slot == 0:
+            pages += 1
+        col, row = slot % cols, slot // cols
+        x = margin + col * cell_w
+        y = height - margin - (row + 1) * cell_h
+
+        # Card border (cut line)
+        c.setDash(3, 3)
+        c.rect(x + 4, y + 4, cell_w - 8, cell_h - 8)
+        c.setDash()
+
+        # Title + student info
+        c.setFont("Helvetica-Bold", 12)
+        c.drawCentredString(x + cell_w / 2, y + cell_h - 28, "IEEE Student ID Card")
+        c.setFont("Helvetica", 10)
+        c.drawString(x + 16, y + cell_h - 50, f"Name: {card['name']}")
+        c.drawString(x + 16, y + cell_h - 64, f"IEEE ID: {card['ieee_id']}")
+        if card.get("domain"):
+            c.drawString(x + 16, y + cell_h - 78, f"Domain: {card['domain']}")
+
+        # QR Code, as large as the cell allows
+        qr_size = min(cell_w - 32, cell_h - 100, 120)
+        if qr_size > 0:
+            qr_image = ImageReader(io.BytesIO(card["qr_bytes"]))
+            c.drawImage(qr_image, x + (cell_w - qr_size) / 2, y + 16, width=qr_size, height=qr_size)
+
+        slot += 1
+        if slot == per_page:
+            c.showPage()
+            slot = 0
+
+    if slot or pages == 0:
+        c.showPage()
+    c.save()
+
+    return (buf.getvalue() if buf is not None else output_path), max(pages, 1)
+
+
+def render_sheet(args):
+    """
+    Process pool task: one page from cards whose QR bytes are already
+    loaded. Returns (pdf_bytes, seconds) so the parent records the timing.
+    """
+    cards, per_page = args
+    started = time.perf_counter()
+    pdf_bytes, _ = render_idcard_sheet_pdf(cards, per_page=per_page)
+    return pdf_bytes, time.perf_counter() - started
+
+
+# ---------------- Streamed PDF Concatenation ----------------
+_XREF_ENTRY = re.compile(rb"(\d{10}) (\d{5}) ([nf])")
+_OBJ_HEADER = re.compile(rb"(\d+) 0 obj")
+_REF = re.compile(rb"(\d+) 0 R")
+_TYPE = re.compile(rb"/Type /(\w+)")
+
+
+class PdfJoiner:
+    """
+    Join rendered PDFs (as written by reportlab) into one document while it
+    is streamed: each add() returns the bytes for that document's pages,
+    renumbered, and only the page list is kept until finish() writes the
+    page tree, cross-reference table and trailer.
+    """
+
+    PAGES_OBJ = 1
+    CATALOG_OBJ = 2
+
+    def __init__(self):
+        self._offsets = {}
+        self._kids = []
+        self._next_obj = 3
+        self._written = 0
+
+    def _emit(self, data: bytes) -> bytes:
+        self._written += len(data)
+        return data
+
+    def start(self) -> bytes:
+        return self._emit(b"%PDF-1.4\n%\x93\x8c\x8b\x9e\n")
+
+    @staticmethod
+    def _objects(pdf: bytes):
+        """[(number, body)] of a PDF's objects, sliced by xref offsets"""
+        xref = pdf.rindex(b"startxref")
+        table = int(pdf[xref + len(b"startxref"):].split()[0])
+        trailer = pdf.index(b"trailer", table)
+        offsets = sorted(
+            int(offset) for offset, _, kind in _XREF_ENTRY.findall(pdf[table:trailer]) if kind == b"n"
+        )
+        objects = []
+        for start, end in zip(offsets, offsets[1:] + [table]):
+            chunk = pdf[start:end]
+            header = _OBJ_HEADER.match(chunk)
+            body = chunk[header.end():]
+            objects.append((int(header.group(1)), body[:body.rindex(b"endobj")]))
+        return objects
+
+    def add(self, pdf: bytes) -> bytes:
+        """Bytes of `pdf`'s pages and resources, numbered into this document"""
+        objects = self._objects(pdf)
+        renumber, dropped = {}, set()
+        for number, body in objects:
+            head = body.split(b"stream", 1)[0]
+            types = set(_TYPE.findall(head))
+            # Each document's catalog, page tree and info dict are replaced
+            # by this document's own; everything else is copied
+            if types & {b"Catalog", b"Pages"} or b"/Producer" in head:
+                dropped.add(number)
+                continue
+            renumber[number] = self._next_obj
+            self._next_obj += 1
+            if b"Page" in types:
+                self._kids.append(renumber[number])
+
+        def ref(match):
+            number = int(match.group(1))
+            # The only kept reference into a dropped object is a page's /Parent
+            return b"%d 0 R" % (self.PAGES_OBJ if number in dropped else renumber[number])
+
+        out = []
+        for number, body in objects:
+            if number in dropped:
+                continue
+            head, sep, stream = body.partition(b"stream")
+            self._offsets[renumber[number]] = self._written
+            out.append(self._emit(b"%d 0 obj" % renumber[number] + _REF.sub(ref, head) + sep + stream + b"endobj\n"))
+        return b"".join(out)
+
+    def finish(self) -> bytes:
+        """The page tree, catalog, cross-reference table and trailer"""
+        kids = b" ".join(b"%d 0 R" % kid for kid in self._kids)
+        out = []
+        self._offsets[self.PAGES_OBJ] = self._written
+        out.append(self._emit(b"%d 0 obj\n<< /Type /Pages /Count %d /Kids [ %s ] >>\nendobj\n"
+                              % (self.PAGES_OBJ, len(self._kids), kids)))
+        self._offsets[self.CATALOG_OBJ] = self._written
+        out.append(self._emit(b"%d 0 obj\n<< /Type /Catalog /Pages %d 0 R >>\nendobj\n"
+                              % (self.CATALOG_OBJ, self.PAGES_OBJ)))
+
+        xref = self._written
+        size = self._next_obj
+        lines = [b"xref\n0 %d\n" % size, b"0000000000 65535 f \n"]
+        lines.extend(b"%010d 00000 n \n" % self._offsets[n] for n in range(1, size))
+        lines.append(b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+                     % (size, self.CATALOG_OBJ, xref))
+        out.append(self._emit(b"".join(lines)))
+        return b"".join(out)
@@ -0,0 +1,47 @@
+# gunicorn.conf.py — picked up automatically by `gunicorn run:app` (see Procfile)
+import os
+import shutil
+import subprocess
+import sys
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+
+# Threaded workers: the SSE endpoints (/attendance/stream, /admin/stream)
+# hold a connection open, which would pin a sync worker for its lifetime.
+# app.events caps open streams per worker (SSE_MAX_STREAMS, a quarter of
+# the threads by default) so page requests always find a free thread.
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", 16))
+timeout = 60
+
+
+def on_starting(server):
+    # Create or migrate the schema once per start, before any worker serves.
+    # A child process, so the master never imports the app: forked workers
+    # (and workers re-spawned on HUP) load fresh code and connections.
+    subprocess.run([sys.executable, "-m", "flask", "--app", "run:app", "init-db"], check=True,
+                   cwd=os.path.dirname(os.path.abspath(__file__)))
+
+    # Workers leave metric snapshots here for /metrics to sum; start each run from zero
+    metrics_dir = os.environ.get("METRICS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "instance", "metrics"))
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+
+
+def post_worker_init(worker):
+    # Optional QR warm-up (QR_WARMUP_ON_START=1), in the first worker only so
+    # workers do not render the same codes; a background thread, so the
+    # worker starts serving at once
+    from app.qr import WARMUP_ON_START, start_warm_up
+    if WARMUP_ON_START and worker.age == 1:
+        start_warm_up()
+
+
+def worker_exit(server, worker):
+    # Commit any self-marks still sitting in the write-behind buffer
+    from app.writebehind import attendance_queue
+    attendance_queue.close()
+
+    # Keep this worker's final counts after it is gone
+    from app.metrics import write_snapshot
+    write_snapshot()
@@ -2,5 +2,8 @@ import os
 from app import app
 
 if __name__ == "__main__":
+    # gunicorn runs this once per start (see gunicorn.conf.py)
+    from app.models import init_db
+    init_db()
     port = int(os.environ.get("PORT", 5000))  # Render provides PORT env var
     app.run(host="0.0.0.0", port=port, debug=False)
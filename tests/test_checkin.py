@@ -0,0 +1,39 @@
+import pytest
+
+from app import app, checkin, db
+from app.models import init_db
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "students.db"))
+    monkeypatch.setattr(checkin, "QR_SIGNING_KEY", None)
+    monkeypatch.setattr(checkin, "LEGACY_KEY_FILE", str(tmp_path / "qr_signing.key"))
+    monkeypatch.setattr(checkin, "_generated_key", {})
+    db.close_db()
+    init_db()
+    with db.transaction() as conn:
+        conn.execute("INSERT INTO students (name, ieee_id) VALUES ('Jane Smith', '654321')")
+    checkin.checkin_index.invalidate()
+
+    client = app.test_client()
+    with client.session_transaction() as s:
+        s["admin"] = True
+    yield client
+    db.close_db()
+
+
+def test_legacy_payload_checks_in_by_default(client):
+    response = client.post("/attendance/checkin/2026-01-01", json={"payload": "Name: Jane Smith, IEEE ID: 654321"})
+    assert response.status_code == 200
+    assert response.get_json()["ieee_id"] == "654321"
+
+
+def test_signed_payload_checks_in(client):
+    response = client.post("/attendance/checkin/2026-01-01", json={"payload": checkin.encode_qr_payload("654321")})
+    assert response.status_code == 200
+
+
+def test_forged_signature_is_rejected(client):
+    response = client.post("/attendance/checkin/2026-01-01", json={"payload": "IEEE1:654321:0000000000000000"})
+    assert response.status_code == 400